@@ -0,0 +1,141 @@
+# aiclient.py
+# One long-lived OpenAI client per (key, base_url) so every query
+# reuses the same HTTP connection pool instead of paying for a new
+# client and a new TCP+TLS handshake each time.
+# Connection setup is timed with the httpx "trace" extension so the
+# app can report how much a reused connection saved.
+# openai and httpx are imported by the first get_client() call
+# so they do not slow down startup.
+
+import os
+import threading
+from time import perf_counter
+
+# pool and timeout settings - wxAI.py fills these from options.ini
+settings = {
+    'base_url': "",
+    'pool_max': 10,         # max open connections
+    'pool_keepalive': 5,    # idle connections kept alive
+    'connect_timeout': 10.0,
+    'read_timeout': 120.0,
+    'max_retries': 2,       # retries done by the openai client itself
+}
+
+_clients = {}       # (key, base_url[, max_retries]) -> OpenAI client
+_lock = threading.Lock()
+_local = threading.local()  # per thread connection timing
+
+build_ms = 0.0      # time it took to construct the last new client
+handshake_ms = 0.0  # last measured cost of opening a connection
+
+
+def _trace(name, info):
+    ''' httpcore trace callback - add up connect and TLS time '''
+    global handshake_ms
+    if name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+        _local.t0 = perf_counter()
+    elif name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+        ms = (perf_counter() - _local.t0) * 1000
+        _local.connect = getattr(_local, 'connect', 0.0) + ms
+        handshake_ms = _local.connect
+
+
+def _on_request(request):
+    ''' httpx request hook - attach the tracer to every request '''
+    request.extensions['trace'] = _trace
+
+
+def get_client(key, base_url=None, max_retries=None):
+    ''' return the shared client for (key, base_url), build it once.
+        max_retries gives a copy of it (same connection pool) that
+        retries that many times instead of settings['max_retries'] '''
+    global build_ms
+    if base_url is None:
+        base_url = settings['base_url']
+    if max_retries is not None:
+        client = get_client(key, base_url)
+        with _lock:
+            copy = _clients.get((key, base_url, max_retries))
+            if copy is None:
+                copy = client.with_options(max_retries=int(max_retries))
+                _clients[(key, base_url, max_retries)] = copy
+        return copy
+    with _lock:
+        client = _clients.get((key, base_url))
+        if client is None:
+            from openai import OpenAI, DefaultHttpxClient
+            import httpx
+            t0 = perf_counter()
+            http_client = DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=int(settings['pool_max']),
+                                    max_keepalive_connections=int(settings['pool_keepalive'])),
+                timeout=httpx.Timeout(float(settings['read_timeout']),
+                                      connect=float(settings['connect_timeout'])),
+                event_hooks={'request': [_on_request]}
+            )
+            client = OpenAI(
+                api_key=os.environ.get(key),
+                base_url=base_url or None,
+                max_retries=int(settings['max_retries']),
+                http_client=http_client
+            )
+            build_ms = (perf_counter() - t0) * 1000
+            _local.built = True
+            _clients[(key, base_url)] = client
+    return client
+
+
+def begin():
+    ''' reset the connection timer for a request on this thread '''
+    _local.connect = 0.0
+    _local.built = False
+
+
+def connect_ms():
+    ''' connection setup time spent by this thread since begin() '''
+    return getattr(_local, 'connect', 0.0)
+
+
+def saved_ms():
+    ''' estimated latency saved by the request that just ran
+        on this thread: client construction, plus the handshake
+        when an already open connection was reused '''
+    if getattr(_local, 'built', False):
+        return 0.0  # paid full price this time
+    if connect_ms() > 0:
+        return build_ms
+    return build_ms + handshake_ms
+
+
+def ask(key, model, query, instructions=None, previous_id=None, max_retries=None):
+    ''' the plain (not streamed) request used by the GUI and batch mode
+        instructions is the role, previous_id continues a conversation.
+        query is the prompt text or a list of input items (attach.py).
+        returns the Responses API response object '''
+    begin()
+    client = get_client(key, max_retries=max_retries)
+    params = {}
+    if instructions:
+        params['instructions'] = instructions
+    if previous_id:
+        params['previous_response_id'] = previous_id
+    return client.responses.create(
+        model=model,
+        input=query.strip() if isinstance(query, str) else query,
+        **params
+    )
+
+
+def warm_up(key, base_url=None):
+    ''' build the client and open a pooled connection ahead of
+        the first query - meant to run on a background thread '''
+    try:
+        begin()
+        client = get_client(key, base_url)
+        client.models.list()
+    except Exception:
+        pass  # best effort - the real request will report errors
+
+
+def start_warm_up(key, base_url=None):
+    threading.Thread(target=warm_up, args=(key, base_url), daemon=True).start()
@@ -0,0 +1,120 @@
+# attach.py
+# Files attached to a prompt (drag and drop or Ctrl-Shift-A).
+# Small text files are sent inline with the prompt. Larger ones (and
+# anything that is not UTF-8 text) are uploaded once with
+# files.create(purpose="user_data") and referenced by file_id. Files
+# are read from disk in chunks - for the SHA-256 and for the upload -
+# and uploads.json maps content hashes to file ids, so a file whose
+# content has not changed is never uploaded again, even after a restart.
+
+import hashlib
+import json
+import os
+import threading
+from time import time
+import aiclient
+
+CHUNK = 1024 * 1024
+
+
+def file_hash(path):
+    ''' SHA-256 of a file, read a chunk at a time '''
+    h = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def signature(paths):
+    ''' cheap stand-in for the contents (name, size, time) - for the cache key '''
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append(path)
+    return "\0".join(parts)
+
+
+def note(paths):
+    ''' the line added to the logged prompt '''
+    if not paths:
+        return ""
+    return "\n\n[attached: " + ", ".join(os.path.basename(p) for p in paths) + "]"
+
+
+def read_text(path, limit):
+    ''' the file as text if it is UTF-8 and at most limit bytes, else None '''
+    if os.path.getsize(path) > limit:
+        return None
+    parts = []
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(CHUNK), b""):
+            parts.append(chunk)
+    try:
+        return b"".join(parts).decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+class Uploads:
+    ''' uploads.json: "base_url|sha256" -> {id, name, bytes, time} '''
+
+    def __init__(self, path="uploads.json"):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, "r", encoding='utf-8') as fin:
+                self.files = json.load(fin)
+        except (OSError, ValueError):
+            self.files = {}
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding='utf-8') as fout:
+            json.dump(self.files, fout, indent=1)
+        os.replace(tmp, self.path)
+
+    def file_id(self, key, path):
+        ''' id of the uploaded file with path's content - uploads it if
+            this content was never uploaded to this server '''
+        digest = file_hash(path)
+        name = f"{aiclient.settings['base_url']}|{digest}"
+        with self.lock:
+            entry = self.files.get(name)
+        if entry:
+            return entry['id']
+        client = aiclient.get_client(key)
+        with open(path, "rb") as fin:   # httpx streams the open file
+            uploaded = client.files.create(file=(os.path.basename(path), fin), purpose="user_data")
+        with self.lock:
+            self.files[name] = {'id': uploaded.id, 'name': os.path.basename(path),
+                                'bytes': os.path.getsize(path), 'time': round(time())}
+            self._save()
+        return uploaded.id
+
+    def forget_named(self, message):
+        ''' drop the file ids an error message names - the server
+            deleted or expired them, the next submit uploads again '''
+        with self.lock:
+            names = [n for n, e in self.files.items() if e['id'] in message]
+            for name in names:
+                del self.files[name]
+            if names:
+                self._save()
+
+
+def build_input(key, query, paths, uploads, inline_bytes):
+    ''' Responses API input: the attached files, then the prompt '''
+    content = []
+    for path in paths:
+        text = read_text(path, inline_bytes)
+        if text is not None:
+            content.append({'type': "input_text",
+                            'text': f"File {os.path.basename(path)}:\n```\n{text}\n```"})
+        else:
+            content.append({'type': "input_file", 'file_id': uploads.file_id(key, path)})
+    content.append({'type': "input_text", 'text': query.strip()})
+    return [{'role': "user", 'content': content}]
@@ -0,0 +1,171 @@
+# batch.py
+# Headless batch mode - no window is opened.
+#
+#   python3 wxAI.py --batch requests.jsonl --out results.jsonl
+#
+# Each input line is a JSON object:
+#   {"id": "q1", "prompt": "...", "model": "optional model name"}
+# Prompts run on a thread pool through the same aiclient request
+# the GUI uses, limited to batch_rpm requests and batch_tpm tokens
+# per minute. Every result is appended to the output file as soon as
+# it finishes, so after a crash a re-run skips the finished ids.
+
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep, perf_counter
+import aiclient
+
+
+class RateLimiter:
+    ''' token buckets for requests per minute and tokens per minute
+        (0 = no limit). Tokens are estimated before a request and
+        corrected with the real usage afterwards. '''
+
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.req = self.rpm   # buckets start full
+        self.tok = self.tpm
+        self.stamp = monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        minutes = (now - self.stamp) / 60
+        self.stamp = now
+        self.req = min(self.rpm, self.req + self.rpm * minutes)
+        self.tok = min(self.tpm, self.tok + self.tpm * minutes)
+
+    def acquire(self, tokens):
+        ''' block until one request and "tokens" tokens are available '''
+        if self.tpm:
+            tokens = min(tokens, self.tpm)  # one huge prompt must still run
+        while True:
+            with self.lock:
+                self._refill()
+                req_ok = not self.rpm or self.req >= 1
+                tok_ok = not self.tpm or self.tok >= tokens
+                if req_ok and tok_ok:
+                    if self.rpm:
+                        self.req -= 1
+                    if self.tpm:
+                        self.tok -= tokens
+                    return
+                wait = 0.0
+                if not req_ok:
+                    wait = (1 - self.req) / self.rpm * 60
+                if not tok_ok:
+                    wait = max(wait, (tokens - self.tok) / self.tpm * 60)
+            sleep(min(wait, 1.0))
+
+    def settle(self, estimated, actual):
+        ''' charge the difference between estimated and real tokens '''
+        if self.tpm:
+            with self.lock:
+                self.tok -= actual - estimated
+
+
+def estimate_tokens(text):
+    ''' rough count - about four characters per token '''
+    return len(text) // 4 + 1
+
+
+def read_requests(path):
+    ''' (id, prompt, model) for every line of a jsonl file '''
+    items = []
+    with open(path, "r", encoding='utf-8') as fin:
+        for n, line in enumerate(fin, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            id = item.get('id', item.get('request_id', n))
+            prompt = item.get('prompt', item.get('input', ""))
+            items.append((str(id), prompt, item.get('model')))
+    return items
+
+
+def finished_ids(path):
+    ''' ids already answered in an earlier (possibly interrupted) run '''
+    done = set()
+    try:
+        with open(path, "r", encoding='utf-8') as fin:
+            for line in fin:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # half written last line
+                if 'error' not in item:
+                    done.add(str(item['id']))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def run(opts, infile, outfile, workers=8, rpm=0, tpm=0, max_out=1024):
+    ''' answer every prompt in infile, append results to outfile
+        opts is the wxAI options list (key, model, ...) '''
+    items = read_requests(infile)
+    done = finished_ids(outfile)
+    todo = [i for i in items if i[0] not in done]
+    print(f"{len(items)} requests, {len(items) - len(todo)} already done, {len(todo)} to run",
+          file=sys.stderr)
+
+    limiter = RateLimiter(rpm, tpm)
+    out_lock = threading.Lock()
+    counts = {'ok': 0, 'failed': 0}
+    fout = open(outfile, "a", encoding='utf-8')
+
+    def one(item):
+        id, prompt, model = item
+        model = model or opts[1]
+        estimate = estimate_tokens(prompt) + max_out
+        limiter.acquire(estimate)
+        t0 = perf_counter()
+        try:
+            response = aiclient.ask(opts[0], model, prompt, opts[4])
+            usage = response.usage
+            limiter.settle(estimate, usage.total_tokens if usage else estimate)
+            result = {'id': id, 'model': model, 'output': response.output_text,
+                      'input_tokens': usage.input_tokens if usage else None,
+                      'output_tokens': usage.output_tokens if usage else None}
+        except Exception as e:
+            result = {'id': id, 'model': model, 'error': str(e)}
+        result['latency'] = round(perf_counter() - t0, 3)
+        with out_lock:
+            fout.write(json.dumps(result) + "\n")
+            fout.flush()  # each result is safe on disk as soon as it is written
+            counts['failed' if 'error' in result else 'ok'] += 1
+
+    t0 = perf_counter()
+    with ThreadPoolExecutor(max_workers=int(workers)) as pool:
+        list(pool.map(one, todo))
+    fout.close()
+    secs = perf_counter() - t0
+    rate = len(todo) / secs * 60 if secs else 0
+    print(f"{counts['ok']} ok, {counts['failed']} failed in {secs:.1f} s ({rate:.0f} per minute)",
+          file=sys.stderr)
+    return counts['failed'] == 0
+
+
+def main(argv, opts):
+    ''' command line entry point called from wxAI.py '''
+    ap = argparse.ArgumentParser(prog="wxAI.py --batch",
+                                 description="answer a jsonl file of prompts without the GUI")
+    ap.add_argument('--batch', required=True, metavar='requests.jsonl')
+    ap.add_argument('--out', default="results.jsonl", metavar='results.jsonl')
+    ap.add_argument('--workers', type=int, default=int(opts[19]))
+    ap.add_argument('--rpm', type=float, default=float(opts[20]), help="requests per minute, 0 = no limit")
+    ap.add_argument('--tpm', type=float, default=float(opts[21]), help="tokens per minute, 0 = no limit")
+    ap.add_argument('--base-url', default=None, help="e.g. a local mock server")
+    args = ap.parse_args(argv)
+    if args.base_url is not None:
+        aiclient.settings['base_url'] = args.base_url
+    # one pooled connection per worker
+    aiclient.settings['pool_max'] = max(int(aiclient.settings['pool_max']), args.workers)
+    aiclient.settings['pool_keepalive'] = max(int(aiclient.settings['pool_keepalive']), args.workers)
+    ok = run(opts, args.batch, args.out, args.workers, args.rpm, args.tpm)
+    return 0 if ok else 1
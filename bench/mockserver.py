@@ -0,0 +1,261 @@
+# mockserver.py
+# Local stand-in for the OpenAI Responses API, for benchmarks and
+# for trying batch mode without a key or network.
+#
+#   python3 bench/mockserver.py --port 8765 --latency 200 --size 2000
+#
+# then point wxAI at it with base_url=http://127.0.0.1:8765/v1
+#
+#   GET  /v1/models
+#   POST /v1/responses      plain JSON, or SSE events with "stream": true;
+#                           input is text or a list with input_file parts
+#   POST /v1/files          multipart upload, answers a file object
+#
+# --latency   ms before the first byte
+# --delay     ms between streamed deltas
+# --size      characters in each answer
+# --chunk     characters per streamed delta
+# --rate-429  fraction of requests answered with 429 + Retry-After
+# --slow      fraction of requests that wait --slow-ms longer (tail latency)
+
+import argparse
+import email.parser
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockConfig:
+    def __init__(self, latency=0, delay=0, size=1000, chunk=8, rate_429=0.0, retry_after=1,
+                 slow=0.0, slow_ms=2000):
+        self.latency = latency / 1000
+        self.delay = delay / 1000
+        self.size = size
+        self.chunk = chunk
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.slow = slow
+        self.slow_ms = slow_ms / 1000
+        self.requests = 0
+        self.files = {}     # file id -> bytes uploaded
+        self.lock = threading.Lock()
+
+
+def answer_text(size):
+    ''' markdown-ish answer of about size characters '''
+    base = ("Here is an answer.\n\n```python\nprint('hello')\n```\n\n"
+            "Some more words about the question asked. ")
+    return (base * (size // len(base) + 1))[:size]
+
+
+def usage(prompt, text):
+    tokens_in = len(prompt) // 4 + 1
+    tokens_out = len(text) // 4 + 1
+    return {'input_tokens': tokens_in, 'output_tokens': tokens_out,
+            'total_tokens': tokens_in + tokens_out,
+            'input_tokens_details': {'cached_tokens': 0},
+            'output_tokens_details': {'reasoning_tokens': 0}}
+
+
+def response_object(id, model, prompt, text, status="completed"):
+    return {
+        'id': id, 'object': 'response', 'created_at': int(time.time()),
+        'status': status, 'model': model, 'error': None,
+        'incomplete_details': None, 'instructions': None, 'metadata': {},
+        'parallel_tool_calls': True, 'temperature': 1.0, 'tool_choice': 'auto',
+        'tools': [], 'top_p': 1.0,
+        'output': [{'type': 'message', 'id': 'msg_' + id, 'status': 'completed',
+                    'role': 'assistant',
+                    'content': [{'type': 'output_text', 'text': text, 'annotations': []}]}],
+        'usage': usage(prompt, text) if status == "completed" else None,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out at once
+
+    def log_message(self, format, *args):
+        pass  # quiet
+
+    def send_json(self, code, obj, headers=()):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                n = int(self.rfile.readline().split(b";")[0], 16)
+                parts.append(self.rfile.read(n))
+                self.rfile.readline()
+                if n == 0:
+                    return b"".join(parts)
+        n = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(n) if n else b""
+
+    def upload(self, body):
+        ''' POST /files - keep the size of the multipart "file" field '''
+        cfg = self.server.cfg
+        head = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode()
+        msg = email.parser.BytesParser().parsebytes(head + body)
+        fields = {part.get_param('name', header='content-disposition'): part
+                  for part in msg.get_payload()}
+        data = fields['file'].get_payload(decode=True)
+        with cfg.lock:
+            id = f"file-{len(cfg.files) + 1}"
+            cfg.files[id] = len(data)
+        self.send_json(200, {'id': id, 'object': 'file', 'bytes': len(data),
+                             'created_at': int(time.time()),
+                             'filename': fields['file'].get_filename(),
+                             'purpose': fields['purpose'].get_payload(), 'status': 'processed'})
+
+    def unknown_file(self, req):
+        ''' id of an input_file the mock never received, or None '''
+        items = req.get('input')
+        if isinstance(items, str):
+            return None
+        for item in items or []:
+            content = item.get('content')
+            for part in content if isinstance(content, list) else []:
+                if part.get('type') == 'input_file' and part.get('file_id') not in self.server.cfg.files:
+                    return part.get('file_id')
+        return None
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {'object': 'list',
+                                 'data': [{'id': 'mock-model', 'object': 'model',
+                                           'created': 0, 'owned_by': 'mock'}]})
+        else:
+            self.send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        cfg = self.server.cfg
+        body = self.read_body()
+        with cfg.lock:
+            cfg.requests += 1
+            n = cfg.requests
+        if self.path.rstrip("/").endswith("/files"):
+            self.upload(body)
+            return
+        if not self.path.rstrip("/").endswith("/responses"):
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+        if cfg.rate_429 and random.random() < cfg.rate_429:
+            self.send_json(429, {'error': {'message': 'Rate limit reached (mock)',
+                                           'type': 'rate_limit_exceeded', 'code': None}},
+                           [("Retry-After", str(cfg.retry_after))])
+            return
+        req = json.loads(body or b"{}")
+        missing = self.unknown_file(req)
+        if missing:
+            self.send_json(404, {'error': {'message': f"No such File object: {missing}",
+                                           'type': 'invalid_request_error', 'code': None}})
+            return
+        prompt = req.get('input', "")
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt)
+        model = req.get('model', 'mock-model')
+        text = answer_text(cfg.size)
+        id = f"resp_{n}"
+        time.sleep(cfg.latency)
+        if cfg.slow and random.random() < cfg.slow:
+            time.sleep(cfg.slow_ms)
+        if req.get('stream'):
+            self.stream(id, model, prompt, text)
+        else:
+            self.send_json(200, response_object(id, model, prompt, text))
+
+    def stream(self, id, model, prompt, text):
+        ''' server-sent events in the order the real API sends them '''
+        cfg = self.server.cfg
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        seq = 0
+
+        def event(obj):
+            nonlocal seq
+            obj['sequence_number'] = seq
+            seq += 1
+            data = f"event: {obj['type']}\ndata: {json.dumps(obj)}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        event({'type': 'response.created',
+               'response': response_object(id, model, prompt, "", "in_progress")})
+        for i in range(0, len(text), cfg.chunk):
+            event({'type': 'response.output_text.delta', 'item_id': 'msg_' + id,
+                   'output_index': 0, 'content_index': 0,
+                   'delta': text[i:i + cfg.chunk], 'logprobs': []})
+            if cfg.delay:
+                time.sleep(cfg.delay)
+        event({'type': 'response.completed',
+               'response': response_object(id, model, prompt, text)})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass   # clients hang up on purpose when a request is cancelled
+
+
+class MockServer:
+    ''' run the mock on a background thread:
+            with MockServer(latency=50) as url: ... '''
+
+    def __init__(self, port=0, **config):
+        self.httpd = QuietServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.cfg = MockConfig(**config)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def cfg(self):
+        return self.httpd.cfg
+
+    def __enter__(self):
+        self.thread.start()
+        return self.url
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="mock OpenAI Responses API")
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--latency', type=float, default=0, help="ms before the first byte")
+    ap.add_argument('--delay', type=float, default=0, help="ms between streamed deltas")
+    ap.add_argument('--size', type=int, default=1000, help="answer length in characters")
+    ap.add_argument('--chunk', type=int, default=8, help="characters per delta")
+    ap.add_argument('--rate-429', type=float, default=0.0, help="fraction of 429 replies")
+    ap.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds")
+    ap.add_argument('--slow', type=float, default=0.0, help="fraction of slow requests")
+    ap.add_argument('--slow-ms', type=float, default=2000, help="extra ms of a slow request")
+    args = ap.parse_args()
+    server = MockServer(args.port, latency=args.latency, delay=args.delay, size=args.size,
+                        chunk=args.chunk, rate_429=args.rate_429, retry_after=args.retry_after,
+                        slow=args.slow, slow_ms=args.slow_ms)
+    print("mock Responses API on", server.url)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# run_bench.py
+# Headless benchmarks for the wxAI hot paths - no window is opened.
+#
+#   python3 bench/run_bench.py --out bench_results.json
+#   python3 bench/run_bench.py --log-mb 1,10,100,500 --compare old.json
+#
+# submit    end-to-end request latency against the local mock server
+#           (new client per request, the old way, vs the pooled client)
+# stream    streamed deltas through StreamBuffer into a simulated UI
+# log       history append (UI side), write-behind flush, View Log page,
+#           markdown export - for each --log-mb size
+# search    history full-text search and the find engine
+#
+# Results are written as JSON; --compare prints the change against
+# an earlier results file.
+
+import argparse
+import json
+import os
+import platform
+import queue
+import statistics
+import sys
+import tempfile
+import threading
+from time import perf_counter, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))   # the wxAI modules
+sys.path.insert(0, HERE)
+
+import mockserver   # noqa: E402
+import streaming    # noqa: E402
+import history      # noqa: E402
+import findengine   # noqa: E402
+
+KEY = "WXAI_BENCH_KEY"
+os.environ.setdefault(KEY, "mock-key")
+
+
+def summary(times):
+    ''' ms statistics of a list of seconds '''
+    ms = sorted(t * 1000 for t in times)
+    return {'n': len(ms), 'mean_ms': round(statistics.mean(ms), 3),
+            'p50_ms': round(ms[len(ms) // 2], 3),
+            'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+            'max_ms': round(ms[-1], 3)}
+
+
+def bench_submit(args):
+    try:
+        import aiclient
+        from openai import OpenAI
+    except ImportError as e:
+        return {'skipped': str(e)}
+    results = {}
+    with mockserver.MockServer(latency=args.latency, size=args.size) as url:
+        aiclient.settings['base_url'] = url
+        cold = []
+        for _ in range(args.requests):  # what gptCode used to do
+            t0 = perf_counter()
+            client = OpenAI(api_key=os.environ[KEY], base_url=url)
+            client.responses.create(model="mock-model", input="benchmark prompt")
+            cold.append(perf_counter() - t0)
+            client.close()
+        results['new_client'] = summary(cold)
+        pooled = []
+        aiclient.get_client(KEY)  # build once, as the warm-up does
+        for _ in range(args.requests):
+            t0 = perf_counter()
+            aiclient.ask(KEY, "mock-model", "benchmark prompt")
+            pooled.append(perf_counter() - t0)
+        results['pooled_client'] = summary(pooled)
+    return results
+
+
+def bench_stream(args):
+    try:
+        import aiclient
+    except ImportError as e:
+        return {'skipped': str(e)}
+    results = {}
+    with mockserver.MockServer(size=args.size * 20, chunk=4, delay=0) as url:
+        aiclient.settings['base_url'] = url
+        client = aiclient.get_client(KEY, url)
+        for flush_ms in (0, 16, 50):
+            ui = queue.Queue()   # stands in for wx.CallAfter
+            shown = []
+
+            def ui_loop():
+                while True:
+                    chunk = ui.get()
+                    if chunk is None:
+                        return
+                    shown.append(chunk)   # stands in for AppendText
+
+            thread = threading.Thread(target=ui_loop)
+            thread.start()
+            buf = streaming.StreamBuffer(ui.put, flush_ms / 1000)
+            stats = {}
+            t0 = perf_counter()
+            text = streaming.stream_text(client, "mock-model", "stream please", buf.add, stats)
+            buf.flush()
+            ui.put(None)
+            thread.join()
+            secs = perf_counter() - t0
+            results[f'flush_{flush_ms}ms'] = {
+                'chars': len(text),
+                'total_ms': round(secs * 1000, 2),
+                'first_token_ms': round((stats['first'] - t0) * 1000, 2),
+                'ui_updates': len(shown),
+                'chars_per_s': round(len(text) / secs)}
+    return results
+
+
+def fill_history(hist, mb):
+    ''' add about mb megabytes of exchanges, return (entries, add seconds) '''
+    answer = mockserver.answer_text(4000)
+    n = max(1, int(mb * 1024 * 1024 / len(answer)))
+    adds = []
+    for i in range(n):
+        t0 = perf_counter()
+        hist.add("mock-model", f"question number {i} about topic{i % 997}", answer)
+        adds.append(perf_counter() - t0)
+    return n, adds
+
+
+def bench_log_and_search(args):
+    results = {'log': {}, 'search': {}}
+    for mb in args.log_mb:
+        with tempfile.TemporaryDirectory() as tmp:
+            hist = history.History(os.path.join(tmp, "history.db"))
+            t0 = perf_counter()
+            n, adds = fill_history(hist, mb)
+            hist.flush()
+            flush = perf_counter() - t0
+            t0 = perf_counter()
+            rows = hist.recent(20)
+            "".join(history.format_entry(r[1], r[3], r[4]) for r in rows)
+            view = perf_counter() - t0
+            t0 = perf_counter()
+            hist.export_markdown(os.path.join(tmp, "log.md"))
+            export = perf_counter() - t0
+            results['log'][f'{mb:g}MB'] = {'entries': n,
+                                         'append': summary(adds),
+                                         'write_behind_total_ms': round(flush * 1000, 1),
+                                         'view_page_ms': round(view * 1000, 3),
+                                         'export_md_ms': round(export * 1000, 1)}
+            searches = []
+            for term in ("topic17", "question", "hello", "missingword"):
+                t0 = perf_counter()
+                hist.search(term)
+                searches.append(perf_counter() - t0)
+            results['search'][f'history_{mb:g}MB'] = summary(searches)
+            hist.close()
+
+    # find engine over a response buffer: first search, then key presses
+    text = mockserver.answer_text(args.find_mb * 1024 * 1024)
+    finder = findengine.FindEngine()
+    t0 = perf_counter()
+    finder.update(lambda: text, "hello")
+    first = perf_counter() - t0
+    presses = []
+    pos = 0
+    for _ in range(1000):
+        t0 = perf_counter()
+        finder.update(lambda: text, "hello")
+        hit = finder.next(pos)
+        presses.append(perf_counter() - t0)
+        pos = hit[2]
+    results['search'][f'find_{args.find_mb}MB'] = {'matches': finder.count(),
+                                                   'first_ms': round(first * 1000, 2),
+                                                   'next': summary(presses)}
+    return results
+
+
+def compare(old, new, path=""):
+    ''' print numeric differences between two result trees '''
+    for key, value in new.items():
+        where = f"{path}.{key}" if path else key
+        before = old.get(key) if isinstance(old, dict) else None
+        if isinstance(value, dict):
+            compare(before or {}, value, where)
+        elif isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+            change = (value - before) / before * 100
+            print(f"{where:60} {before:>12} -> {value:<12} {change:+.1f}%")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="wxAI benchmarks (headless)")
+    ap.add_argument('--out', default="bench_results.json")
+    ap.add_argument('--compare', metavar='OLD.json')
+    ap.add_argument('--only', default="submit,stream,log", help="submit,stream,log")
+    ap.add_argument('--requests', type=int, default=30)
+    ap.add_argument('--latency', type=float, default=20, help="mock server ms")
+    ap.add_argument('--size', type=int, default=2000, help="answer characters")
+    ap.add_argument('--log-mb', default="1,10", help="history sizes, e.g. 1,10,100,500")
+    ap.add_argument('--find-mb', type=int, default=5)
+    args = ap.parse_args()
+    args.log_mb = [float(x) for x in args.log_mb.split(",")]
+    only = args.only.split(",")
+
+    results = {'meta': {'time': time(), 'python': platform.python_version(),
+                        'platform': platform.platform()}}
+    if "submit" in only:
+        results['submit'] = bench_submit(args)
+    if "stream" in only:
+        results['stream'] = bench_stream(args)
+    if "log" in only:
+        results.update(bench_log_and_search(args))
+
+    with open(args.out, "w", encoding='utf-8') as fout:
+        json.dump(results, fout, indent=2)
+    print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, "r", encoding='utf-8') as fin:
+            compare(json.load(fin), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# bigview.py
+# Line index over a memory-mapped file, for viewing very large
+# files (log.md exports of a long history) a screen at a time.
+# Only the start offset of each line is kept in memory - 8 bytes a
+# line - and the text of a line is decoded when it is displayed.
+# The index is built in chunks on a background thread so the first
+# lines can be shown at once.
+
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+
+try:
+    import numpy   # optional - finds new lines much faster
+except ImportError:
+    numpy = None
+
+CHUNK = 8 * 1024 * 1024
+
+
+class LineIndex:
+    ''' start offsets of the lines in a file, built by build() '''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.starts = array('q', [0])
+        self.scanned = 0       # bytes indexed so far
+        self.done = self.size == 0
+        self.stop = False
+
+    def build(self):
+        ''' index the whole file - run on a worker thread '''
+        pos = 0
+        while pos < self.size and not self.stop:
+            end = min(pos + CHUNK, self.size)
+            chunk = self.mm[pos:end]
+            if numpy is not None:
+                found = numpy.flatnonzero(numpy.frombuffer(chunk, dtype=numpy.uint8) == 10)
+                self.starts.extend((found + pos + 1).tolist())
+            else:
+                i = chunk.find(b"\n")
+                while i != -1:
+                    self.starts.append(pos + i + 1)
+                    i = chunk.find(b"\n", i + 1)
+            pos = end
+            self.scanned = pos
+        self.done = True
+        if self.stop:
+            self._release()   # closed while indexing
+
+    def progress(self):
+        return self.scanned / self.size if self.size else 1.0
+
+    def count(self):
+        ''' lines available so far '''
+        n = len(self.starts)
+        if not self.done or self.starts[n - 1] == self.size:
+            n -= 1   # last start is an unfinished line, or the end of file
+        return max(n, 0)
+
+    def line(self, i):
+        start = self.starts[i]
+        end = self.starts[i + 1] - 1 if i + 1 < len(self.starts) else self.size
+        return self.mm[start:end].decode('utf-8', errors='replace').rstrip("\r")
+
+    def line_of(self, offset):
+        ''' line number that contains byte offset '''
+        return bisect_right(self.starts, offset) - 1
+
+    def find(self, text, from_line=0):
+        ''' first line at or after from_line containing text, or -1 '''
+        if not self.size or from_line >= self.count():
+            return -1
+        i = self.mm.find(text.encode('utf-8'), self.starts[from_line])
+        if i == -1 or i >= self.scanned and not self.done:
+            return -1
+        return self.line_of(i)
+
+    def close(self):
+        self.stop = True
+        if self.done:
+            self._release()
+
+    def _release(self):
+        if self.size:
+            self.mm.close()
+        self.file.close()
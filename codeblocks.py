@@ -0,0 +1,79 @@
+# codeblocks.py
+# Index of the fenced code blocks in a response.
+# Text is fed in as it arrives (whole responses or streamed pieces);
+# only complete new lines are looked at, so the response is never
+# scanned twice. Each finished block keeps its code as a string, so
+# copying block N is a list lookup.
+
+EXTENSIONS = {'python': 'py', 'py': 'py', 'javascript': 'js', 'js': 'js',
+              'typescript': 'ts', 'ts': 'ts', 'bash': 'sh', 'sh': 'sh', 'shell': 'sh',
+              'c': 'c', 'cpp': 'cpp', 'c++': 'cpp', 'java': 'java', 'go': 'go',
+              'rust': 'rs', 'html': 'html', 'css': 'css', 'json': 'json',
+              'yaml': 'yaml', 'sql': 'sql', 'markdown': 'md', 'ini': 'ini'}
+
+
+class CodeBlock:
+    def __init__(self, lang, start):
+        self.lang = lang      # language tag after the fence, may be ""
+        self.start = start    # offset of the opening fence line
+        self.end = None       # offset after the closing fence, None while open
+        self.lines = []
+        self.code = ""
+
+    def extension(self):
+        return EXTENSIONS.get(self.lang.lower(), 'txt')
+
+
+class CodeBlockIndex:
+    ''' fenced blocks of one text, built by feed() '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.blocks = []      # finished blocks
+        self.current = None   # block whose closing fence has not come yet
+        self.fence = ""       # the opening fence of the current block
+        self.partial = ""     # text after the last new line
+        self.pos = 0          # offset of self.partial in the text
+
+    def feed(self, text):
+        ''' add the next piece of the text '''
+        data = self.partial + text
+        lines = data.split("\n")
+        self.partial = lines.pop()   # incomplete last line waits for more
+        for line in lines:
+            self._line(line, self.pos)
+            self.pos += len(line) + 1
+
+    def _line(self, line, offset):
+        stripped = line.strip()
+        if self.current is None:
+            if stripped.startswith("```") or stripped.startswith("~~~"):
+                mark = stripped[0]
+                n = len(stripped) - len(stripped.lstrip(mark))
+                self.fence = mark * n
+                self.current = CodeBlock(stripped[n:].strip(), offset)
+        elif stripped.startswith(self.fence) and stripped.strip(self.fence[0]) == "":
+            block = self.current
+            block.end = offset + len(line) + 1
+            block.code = "\n".join(block.lines)
+            block.lines = []
+            self.blocks.append(block)
+            self.current = None
+        else:
+            self.current.lines.append(line)
+
+    def all_blocks(self):
+        ''' finished blocks, plus the unfinished last one (if any) '''
+        if self.current is None:
+            return self.blocks
+        tail = CodeBlock(self.current.lang, self.current.start)
+        tail.code = "\n".join(self.current.lines +
+                              ([self.partial] if self.partial else []))
+        return self.blocks + [tail]
+
+    def get(self, n):
+        ''' code of block n (0 based) or None '''
+        blocks = self.all_blocks()
+        return blocks[n].code if 0 <= n < len(blocks) else None
@@ -0,0 +1,59 @@
+# conversation.py
+# Server side conversation state for one tab.
+# Turns are chained with previous_response_id so earlier turns are
+# not sent again. The size of the thread is followed from the token
+# usage of each turn; once it passes the budget the thread is
+# summarized and a new chain starts with the summary in the
+# instructions.
+
+SUMMARY_PROMPT = ("Summarize our conversation so far in a compact form that keeps "
+                  "every fact, decision, name and code detail needed to continue it.")
+
+
+class Conversation:
+    ''' previous_response_id chaining with a token budget (0 = no limit) '''
+
+    def __init__(self, budget=0):
+        self.budget = int(budget)
+        self.reset()
+
+    def reset(self):
+        self.previous_id = None   # id of the last response in the chain
+        self.tokens = 0           # context size after the last turn
+        self.turns = 0
+        self.summary = ""         # summary of compacted turns
+
+    def instructions(self, role):
+        ''' the role, plus the summary of older turns if there is one '''
+        if not self.summary:
+            return role
+        return role + "\n\nSummary of the conversation so far:\n" + self.summary
+
+    def record(self, response_id, usage):
+        ''' a turn completed - continue the chain from it '''
+        self.previous_id = response_id
+        self.turns += 1
+        if usage is not None:
+            # the next turn re-reads all of this on the server
+            self.tokens = (usage.input_tokens or 0) + (usage.output_tokens or 0)
+
+    def over_budget(self):
+        return bool(self.budget and self.previous_id and self.tokens > self.budget)
+
+    def compact(self, ask, role):
+        ''' replace the chain by a summary.
+            ask(query, instructions, previous_id) returns a response. '''
+        response = ask(SUMMARY_PROMPT, self.instructions(role), self.previous_id)
+        self.summary = response.output_text
+        self.previous_id = None
+        self.tokens = len(self.summary) // 4
+        return self.summary
+
+    def describe(self):
+        text = f"conversation: {self.turns} turns, {self.tokens}"
+        if self.budget:
+            text += f"/{self.budget}"
+        text += " tokens"
+        if self.summary:
+            text += " (compacted)"
+        return text
@@ -0,0 +1,571 @@
+# daemon.py
+# wxAI as a local service, so the GUI, editor plugins and scripts
+# share one warmed OpenAI client (connection pool), response cache,
+# rate limiter and history.db instead of each starting their own.
+#
+#   python3 wxAI.py --daemon                      (address from "daemon" option)
+#   python3 wxAI.py --daemon --listen 127.0.0.1:8766
+#   python3 wxAI.py --daemon --listen /tmp/wxai.sock
+#
+#   GET  /health
+#   POST /submit         {"prompt": "...", "model": "...", "stream": true, "refresh": false}
+#                        plain: one JSON object; stream: JSON lines, {"delta": "..."}
+#                        for each piece, then the same object as a plain answer
+#   GET  /history?n=20&before=ID
+#   GET  /history/ID
+#   POST /history        {"model": "...", "prompt": "...", "response": "..."}
+#   GET  /search?q=text&limit=50
+#
+# The same prompt submitted by two tools at once is sent to the API
+# only once; the second caller gets the first caller's answer.
+#
+# Every request must carry the token the daemon writes to daemon.token
+# (readable by this user only) in an X-wxAI-Token header. Requests with
+# an Origin header (web pages), a Host that is not the listening
+# loopback address (DNS rebinding) or a POST body that is not JSON are
+# refused, so a browser cannot reach the daemon.
+#
+# Client and RemoteHistory are the thin client side, used by the GUI
+# when "daemon" is set in options.ini.
+
+import argparse
+import hmac
+import http.client
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qs, quote
+import aiclient
+import batch
+import history
+import metrics
+import respcache
+import retry
+import streaming
+
+DEFAULT_ADDRESS = "127.0.0.1:8766"
+TOKEN_FILE = "daemon.token"
+TOKEN_HEADER = "X-wxAI-Token"
+LOOPBACK = ("127.0.0.1", "localhost", "[::1]")
+MAX_OUT = 1024   # output tokens assumed by the rate limiter before the answer
+
+
+def parse_address(text):
+    ''' "/path/to.sock" -> path, "host:port" or "port" -> (host, port) '''
+    text = (text or DEFAULT_ADDRESS).strip()
+    if "/" in text or text.endswith(".sock"):
+        return text
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def write_token(path=TOKEN_FILE):
+    ''' a new random token in a file only this user can read '''
+    token = secrets.token_urlsafe(32)
+    if os.path.exists(path):
+        os.unlink(path)   # a new file gets the 0600 mode below
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding='utf-8') as fout:
+        fout.write(token)
+    return token
+
+
+def read_token(path=TOKEN_FILE):
+    try:
+        with open(path, "r", encoding='utf-8') as fin:
+            return fin.read().strip()
+    except OSError:
+        return ""
+
+
+class Flight:
+    ''' one request in progress - later identical submits wait on it '''
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Service:
+    ''' everything the daemon shares between its callers '''
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.cache = None
+        if opts[14].lower() == "on":
+            self.cache = respcache.ResponseCache("cache.db", opts[15], opts[16], opts[17])
+        self.history = None
+        if opts[5].lower() == "on":
+            self.history = history.open_history("history.db", "log.md")
+            self.history.on_error = lambda msg: print("history:", msg, file=sys.stderr)
+        self.metrics = None
+        if opts[25].lower() == "on":
+            self.metrics = metrics.Metrics("metrics.jsonl")
+        self.limiter = batch.RateLimiter(opts[20], opts[21])
+        self.lock = threading.Lock()
+        self.flights = {}   # cache key -> Flight
+
+    def submit(self, prompt, model=None, refresh=False, on_delta=None):
+        ''' answer prompt as a dict: text, model, cached, shared, ms,
+            input_tokens, output_tokens, cached_tokens.
+            on_delta(text) receives streamed pieces. '''
+        opts = self.opts
+        model = model or opts[1]
+        key = respcache.make_key(model, opts[4], prompt)
+        t0 = perf_counter()
+        if self.cache and not refresh:
+            text = self.cache.get(key)
+            if text is not None:
+                if on_delta:
+                    on_delta(text)
+                return {'text': text, 'model': model, 'cached': True, 'shared': False,
+                        'ms': round((perf_counter() - t0) * 1000, 3)}
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if not leader:   # the same prompt is already on its way
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if on_delta:
+                on_delta(flight.result['text'])
+            return dict(flight.result, shared=True, ms=round((perf_counter() - t0) * 1000, 3))
+        try:
+            flight.result = self._ask(prompt, model, key, on_delta, t0)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def _ask(self, prompt, model, key, on_delta, t0):
+        opts = self.opts
+        estimate = batch.estimate_tokens(prompt) + MAX_OUT
+        self.limiter.acquire(estimate)
+        start = perf_counter()
+        stats = {}
+        gone = []   # set when the caller hung up - the answer is still kept
+
+        def deliver(delta):
+            if not gone:
+                try:
+                    on_delta(delta)
+                except OSError:
+                    gone.append(True)
+
+        def call():
+            if on_delta:
+                aiclient.begin()
+                client = aiclient.get_client(opts[0], max_retries=0)
+                text = streaming.stream_text(client, model, prompt, deliver, stats, opts[4])
+            else:
+                response = aiclient.ask(opts[0], model, prompt, opts[4], max_retries=0)
+                stats['usage'] = response.usage
+                text = response.output_text
+            stats['connect'] = aiclient.connect_ms()
+            return text
+
+        text = retry.with_retries(call, retry.CancelToken(), int(opts[28]),
+                                  int(opts[29]) / 1000, int(opts[30]) / 1000,
+                                  can_retry=lambda: 'first' not in stats)
+        end = perf_counter()
+        usage = stats.get('usage')
+        tokens_in, tokens_out, cached = metrics.usage_counts(usage)
+        self.limiter.settle(estimate, tokens_in + tokens_out if usage else estimate)
+        if self.cache:
+            self.cache.put(key, text)
+        if self.history:
+            self.history.add(model, prompt, text)
+        if self.metrics:
+            self.metrics.add(model, (start - t0) * 1000, stats['connect'],
+                             (stats.get('first', end) - start) * 1000,
+                             (end - start) * 1000, usage)
+        return {'text': text, 'model': model, 'cached': False, 'shared': False,
+                'ms': round((end - t0) * 1000, 3), 'input_tokens': tokens_in,
+                'output_tokens': tokens_out, 'cached_tokens': cached}
+
+    def close(self):
+        if self.history:
+            self.history.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # callers keep their connection open
+
+    def log_message(self, format, *args):
+        pass  # quiet
+
+    def address_string(self):
+        return str(self.client_address)   # "" on a Unix socket
+
+    def send_json(self, code, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        n = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(n) or b"{}") if n else {}
+
+    def refused(self, post=False):
+        ''' error message if the request is not from a local tool of
+            this user, else None '''
+        if self.headers.get("Origin") is not None:
+            return "cross-origin requests are not served"
+        hosts = self.server.hosts
+        if hosts is not None and self.headers.get("Host", "").lower() not in hosts:
+            return "wrong Host"
+        token = self.headers.get(TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+            return f"missing or wrong {TOKEN_HEADER} (see {TOKEN_FILE})"
+        if post:
+            kind = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if kind != "application/json":
+                return "Content-Type must be application/json"
+        return None
+
+    def refuse(self, post=False):
+        ''' answer 403 and True when refused() says so '''
+        error = self.refused(post)
+        if error is None:
+            return False
+        self.close_connection = True   # the body, if any, is not read
+        self.send_json(403, {'error': error})
+        return True
+
+    def do_GET(self):
+        if self.refuse():
+            return
+        service = self.server.service
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        if parts == ["health"]:
+            self.send_json(200, {'ok': True, 'pid': os.getpid(), 'model': service.opts[1],
+                                 'log': service.history is not None})
+        elif parts[0] == "history" and service.history is None:
+            self.send_json(404, {'error': "log is 'off'"})
+        elif parts == ["history"]:
+            before = query.get('before')
+            rows = service.history.recent(int(query.get('n', 20)),
+                                          int(before) if before else None)
+            self.send_json(200, {'rows': rows, 'count': service.history.count()})
+        elif len(parts) == 2 and parts[0] == "history":
+            self.send_json(200, {'row': service.history.get(int(parts[1]))})
+        elif parts == ["search"] and service.history is not None:
+            self.send_json(200, {'rows': service.history.search(query.get('q', ""),
+                                                                int(query.get('limit', 200)))})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.refuse(post=True):
+            return
+        service = self.server.service
+        path = urlsplit(self.path).path.strip("/")
+        try:
+            req = self.read_json()
+        except ValueError as e:
+            self.send_json(400, {'error': f"bad JSON: {e}"})
+            return
+        if path == "history":
+            if service.history:
+                service.history.add(req.get('model', ""), req['prompt'], req['response'])
+            self.send_json(200, {'ok': True})
+        elif path != "submit" or not req.get('prompt', "").strip():
+            self.send_json(404 if path != "submit" else 400, {'error': 'nothing to submit'})
+        elif req.get('stream'):
+            self.stream(service, req)
+        else:
+            try:
+                result = service.submit(req['prompt'], req.get('model'), req.get('refresh', False))
+            except Exception as e:
+                self.send_json(502, {'error': str(e)})
+                return
+            self.send_json(200, result)
+
+    def stream(self, service, req):
+        ''' JSON lines in HTTP chunks: deltas, then the result or an error '''
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def line(obj):
+            data = json.dumps(obj).encode('utf-8') + b"\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            try:
+                result = service.submit(req['prompt'], req.get('model'), req.get('refresh', False),
+                                        lambda delta: line({'delta': delta}))
+                result = dict(result)
+                del result['text']   # the caller has it from the deltas
+                line(result)
+            except OSError:
+                raise
+            except Exception as e:
+                line({'error': str(e)})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except OSError:
+            self.close_connection = True   # the caller hung up (cancelled)
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(opts, address, token_file=TOKEN_FILE):
+    ''' run the daemon until Ctrl-C '''
+    address = parse_address(address)
+    if isinstance(address, str):
+        if os.path.exists(address):
+            os.unlink(address)   # left over from an earlier run
+        server = UnixServer(address, Handler)
+        os.chmod(address, 0o600)   # only this user may submit
+        server.hosts = None        # no Host to rebind on a socket
+        where = address
+    else:
+        server = ThreadingHTTPServer(address, Handler)
+        host, port = server.server_address[:2]
+        names = set(LOOPBACK) | {address[0].lower()}
+        server.hosts = {f"{name}:{port}" for name in names}
+        where = "http://%s:%d" % (host, port)
+    server.token = write_token(token_file)
+    server.service = Service(opts)
+    aiclient.start_warm_up(opts[0])
+    print("wxAI daemon on", where, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+        if os.path.exists(token_file):
+            os.unlink(token_file)
+    return 0
+
+
+def main(argv, opts):
+    ''' command line entry point called from wxAI.py '''
+    ap = argparse.ArgumentParser(prog="wxAI.py --daemon",
+                                 description="serve wxAI requests to local tools")
+    ap.add_argument('--daemon', action='store_true')
+    ap.add_argument('--listen', default=opts[32] or DEFAULT_ADDRESS,
+                    help="host:port or the path of a Unix socket")
+    ap.add_argument('--base-url', default=None, help="e.g. a local mock server")
+    ap.add_argument('--token-file', default=TOKEN_FILE,
+                    help="where the access token for clients is written")
+    args = ap.parse_args(argv)
+    if args.base_url is not None:
+        aiclient.settings['base_url'] = args.base_url
+    return serve(opts, args.listen, args.token_file)
+
+
+# ----------------------------
+#   thin client
+# ----------------------------
+
+def describe(result):
+    ''' one line status bar readout for a daemon answer '''
+    text = f"daemon: {result['model']} {result['ms'] / 1000:.2f} s"
+    if result.get('cached'):
+        return text + ", cached"
+    if result.get('shared'):
+        return text + ", shared with another caller"
+    return text + f", {result.get('input_tokens', 0)} in / {result.get('output_tokens', 0)} out"
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class Client:
+    ''' talks to a running daemon - one kept-alive connection per thread '''
+
+    def __init__(self, address, timeout=300, token_file=TOKEN_FILE):
+        self.address = parse_address(address)
+        self.timeout = timeout
+        self.token_file = token_file
+        self.token = read_token(token_file)
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            if isinstance(self.address, str):
+                conn = UnixConnection(self.address, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(*self.address, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None):
+        ''' send a request, return the response (headers read).
+            The token is read again once if the daemon refuses it
+            (it writes a new one each time it starts). '''
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        for again in (True, False):
+            headers = {TOKEN_HEADER: self.token}
+            if data:
+                headers["Content-Type"] = "application/json"
+            conn = self._connection()
+            try:
+                conn.request(method, path, data, headers)
+                resp = conn.getresponse()
+            except (ConnectionError, http.client.HTTPException, OSError):
+                conn.close()   # the daemon closed an idle connection
+                self.local.conn = None
+                if not again:
+                    raise
+                continue
+            if resp.status == 403 and again and read_token(self.token_file) != self.token:
+                resp.read()
+                conn.close()
+                self.local.conn = None
+                self.token = read_token(self.token_file)
+                continue
+            return resp
+
+    def call(self, method, path, body=None):
+        resp = self._request(method, path, body)
+        result = json.loads(resp.read() or b"{}")
+        if resp.status != 200:
+            raise RuntimeError(result.get('error', f"daemon: HTTP {resp.status}"))
+        return result
+
+    def health(self):
+        return self.call("GET", "/health")
+
+    def submit(self, prompt, model=None, refresh=False, on_delta=None, stats=None, cancel=None):
+        ''' the answer text. stats (dict) receives the daemon's result
+            plus 'first' and 'usage' like gptCode; cancel (retry.CancelToken)
+            drops the connection. '''
+        if stats is None:
+            stats = {}
+        req = {'prompt': prompt, 'model': model, 'refresh': refresh, 'stream': bool(on_delta)}
+        resp = self._request("POST", "/submit", req)
+        if cancel is not None:
+            conn = self.local.conn
+            cancel.on_cancel(lambda: conn.sock and conn.sock.shutdown(socket.SHUT_RDWR))
+        try:
+            if not on_delta:
+                result = json.loads(resp.read() or b"{}")
+                if resp.status != 200:
+                    raise RuntimeError(result.get('error', f"daemon: HTTP {resp.status}"))
+            else:
+                parts = []
+                result = None
+                for line in resp:
+                    obj = json.loads(line)
+                    if 'delta' in obj:
+                        if not parts:
+                            stats['first'] = perf_counter()
+                        parts.append(obj['delta'])
+                        on_delta(obj['delta'])
+                    elif 'error' in obj:
+                        raise RuntimeError(obj['error'])
+                    else:
+                        result = obj
+                if result is None:
+                    raise ConnectionError("daemon closed the stream")
+                result['text'] = "".join(parts)
+        except (OSError, ValueError):
+            self.local.conn = None
+            if cancel is not None and cancel.cancelled:
+                raise retry.Cancelled("Request cancelled")
+            raise
+        stats.update(result)
+        stats['usage'] = SimpleNamespace(
+            input_tokens=result.get('input_tokens', 0), output_tokens=result.get('output_tokens', 0),
+            input_tokens_details=SimpleNamespace(cached_tokens=result.get('cached_tokens', 0)))
+        return result['text']
+
+
+class RemoteHistory:
+    ''' the daemon's history.db with the History methods the GUI uses.
+        add() is queued to a writer thread like History.add; failed
+        writes go to on_error(message). Reads raise ConnectionError
+        when the daemon cannot be reached. '''
+
+    def __init__(self, client):
+        self.client = client
+        self.on_error = None
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_behind, name="remote history",
+                                       daemon=True)
+        self.writer.start()
+
+    def add(self, model, prompt, response, ts=None):
+        ''' queue an exchange - returns immediately '''
+        self.queue.put({'model': model, 'prompt': prompt, 'response': response})
+
+    def _write_behind(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.client.call("POST", "/history", item)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(f"exchange not saved by the daemon: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join(5)
+
+    def _get(self, path):
+        try:
+            return self.client.call("GET", path)
+        except (OSError, http.client.HTTPException) as e:
+            raise ConnectionError(f"daemon not reachable: {e}") from e
+
+    def recent(self, n, before=None):
+        path = f"/history?n={int(n)}"
+        if before is not None:
+            path += f"&before={int(before)}"
+        return self._get(path)['rows']
+
+    def get(self, id):
+        return self._get(f"/history/{int(id)}")['row']
+
+    def search(self, text, limit=200):
+        return self._get(f"/search?q={quote(text)}&limit={int(limit)}")['rows']
+
+    def count(self):
+        return self._get("/history?n=0")['count']
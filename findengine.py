@@ -0,0 +1,79 @@
+# findengine.py
+# Find-in-text for the response area.
+# All match offsets are found in one pass and kept until the text
+# or the search changes, so Find next / Find previous only do a
+# binary search - the buffer is not copied again on every key press.
+# Case is ignored by the compiled pattern (re.IGNORECASE) rather than
+# by lower-casing a copy, so offsets always line up with the text.
+
+import re
+from bisect import bisect_left
+
+
+class FindEngine:
+    ''' cached matches for one text buffer '''
+
+    def __init__(self):
+        self.text = None      # None = buffer changed, fetch again
+        self.key = None       # (pattern, regex, whole, case) of cached matches
+        self.starts = []
+        self.ends = []
+        self.current = -1     # index of the match last returned
+
+    def invalidate(self):
+        ''' call when the buffer has changed '''
+        self.text = None
+
+    def compile(self, pattern, regex=False, whole=False, case=False):
+        ''' build the regular expression for a search - may raise re.error '''
+        expr = pattern if regex else re.escape(pattern)
+        if whole:
+            expr = r'\b(?:' + expr + r')\b'
+        return re.compile(expr, 0 if case else re.IGNORECASE)
+
+    def update(self, get_text, pattern, regex=False, whole=False, case=False):
+        ''' make sure the matches are current.
+            get_text is only called when the buffer has changed.
+            Returns True when the matches were recomputed. '''
+        key = (pattern, regex, whole, case)
+        if self.text is not None and key == self.key:
+            return False
+        if self.text is None:
+            self.text = get_text()
+        rx = self.compile(pattern, regex, whole, case)
+        self.starts = []
+        self.ends = []
+        for m in rx.finditer(self.text):
+            if m.end() > m.start():  # skip empty regex matches
+                self.starts.append(m.start())
+                self.ends.append(m.end())
+        self.key = key
+        self.current = -1
+        return True
+
+    def count(self):
+        return len(self.starts)
+
+    def next(self, pos):
+        ''' first match starting at or after pos (wraps around)
+            returns (index, start, end) or None '''
+        if not self.starts:
+            return None
+        i = bisect_left(self.starts, pos)
+        if i == len(self.starts):
+            i = 0
+        self.current = i
+        return i, self.starts[i], self.ends[i]
+
+    def previous(self, pos):
+        ''' last match starting before pos (wraps around) '''
+        if not self.starts:
+            return None
+        i = bisect_left(self.starts, pos) - 1
+        if i < 0:
+            i = len(self.starts) - 1
+        self.current = i
+        return i, self.starts[i], self.ends[i]
+
+    def matches(self):
+        return zip(self.starts, self.ends)
@@ -0,0 +1,250 @@
+# history.py
+# Query history in SQLite (history.db), one row per exchange.
+# Writes go through a queue to a background thread (write-behind)
+# so the GUI never waits on the disk. A write that fails (the database
+# locked by another program) is retried, then kept for the next write
+# and reported through on_error.
+# A full-text index (SQLite FTS5) over prompts and responses is kept
+# up to date by a trigger as each row is inserted.
+# export_markdown() still produces the old log.md format.
+#
+#   python3 history.py export [log.md]
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+import queue
+from time import localtime, strftime, strptime, mktime, time, sleep
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS exchange (
+                id INTEGER PRIMARY KEY,
+                ts REAL,
+                model TEXT,
+                prompt TEXT,
+                response TEXT,
+                prompt_bytes INTEGER,
+                response_bytes INTEGER)'''
+
+WRITE_TIMEOUT = 5    # seconds the writer waits for a lock held by another connection
+WRITE_RETRIES = 3
+
+FTS_SCHEMA = [
+    '''CREATE VIRTUAL TABLE exchange_fts USING fts5(
+           prompt, response, content='exchange', content_rowid='id')''',
+    '''CREATE TRIGGER exchange_ai AFTER INSERT ON exchange BEGIN
+           INSERT INTO exchange_fts(rowid, prompt, response)
+           VALUES (new.id, new.prompt, new.response);
+       END''',
+    '''CREATE TRIGGER exchange_ad AFTER DELETE ON exchange BEGIN
+           INSERT INTO exchange_fts(exchange_fts, rowid, prompt, response)
+           VALUES ('delete', old.id, old.prompt, old.response);
+       END''',
+    "INSERT INTO exchange_fts(exchange_fts) VALUES ('rebuild')",  # index older rows
+]
+
+
+def fts_query(text):
+    ''' turn what the user typed into an FTS5 query:
+        every word must appear, a trailing * keeps prefix matching '''
+    terms = []
+    for word in text.split():
+        star = word.endswith('*') and len(word) > 1
+        word = word.rstrip('*').replace('"', '""')
+        terms.append('"' + word + '"' + ('*' if star else ''))
+    return " ".join(terms)
+
+
+def format_entry(ts, prompt, response):
+    ''' one exchange in the log.md markdown layout '''
+    today = strftime("%a %d %b %Y", localtime(ts))
+    tm = strftime("%H:%M", localtime(ts))
+    return ("\n\n=================================== " + today + " " + tm + "\n"
+            + prompt
+            + "\n=====================================\n\n"
+            + response)
+
+
+class History:
+    ''' history.db reader plus a write-behind writer thread '''
+
+    def __init__(self, path="history.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')  # readers don't block the writer
+        self.db.execute(SCHEMA)
+        if not self.db.execute("SELECT 1 FROM sqlite_master WHERE name='exchange_fts'").fetchone():
+            for sql in FTS_SCHEMA:
+                self.db.execute(sql)
+        self.db.commit()
+        self.queue = queue.Queue()
+        self.error = None      # message of the last failed write, None once written
+        self.on_error = None   # on_error(message) - called on the writer thread
+        self.writer = threading.Thread(target=self._write_behind, daemon=True)
+        self.writer.start()
+
+    def add(self, model, prompt, response, ts=None):
+        ''' queue an exchange - returns immediately '''
+        self.queue.put((ts or time(), model, prompt, response))
+
+    def _write_behind(self):
+        ''' writer thread: insert queued rows in batches '''
+        db = sqlite3.connect(self.path, timeout=WRITE_TIMEOUT)
+        pending = []   # rows of a failed write, tried again with the next one
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            while True:  # take whatever else is already waiting
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                rows = pending + [r for r in batch if r is not None]
+                pending = []
+                if rows and not self._insert(db, rows):
+                    pending = rows
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if None in batch:
+                db.close()
+                return
+
+    def _insert(self, db, rows):
+        ''' write rows, retrying a locked database - False to try them again later '''
+        for attempt in range(WRITE_RETRIES):
+            try:
+                db.executemany('INSERT INTO exchange VALUES (NULL, ?, ?, ?, ?, ?, ?)',
+                               [(ts, model, p, r, len(p.encode('utf-8')), len(r.encode('utf-8')))
+                                for ts, model, p, r in rows])
+                db.commit()
+                self.error = None
+                return True
+            except sqlite3.OperationalError as e:   # locked or busy - worth another go
+                db.rollback()
+                self.error = str(e)
+                sleep(0.5 * 2 ** attempt)
+            except Exception as e:   # these rows can never be written
+                db.rollback()
+                self._report(f"{len(rows)} exchanges dropped: {e}")
+                return True
+        self._report(f"{len(rows)} exchanges not saved yet: {self.error}")
+        return False
+
+    def _report(self, message):
+        self.error = message
+        if self.on_error:
+            try:
+                self.on_error(message)
+            except Exception:
+                pass
+
+    def flush(self):
+        ''' wait until every queued exchange is on disk '''
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        self.db.close()
+
+    def recent(self, n, before=None):
+        ''' the n newest exchanges (older than id "before"),
+            returned oldest first as (id, ts, model, prompt, response) '''
+        with self.lock:
+            if before is None:
+                rows = self.db.execute('SELECT id, ts, model, prompt, response FROM exchange '
+                                       'ORDER BY id DESC LIMIT ?', (n,)).fetchall()
+            else:
+                rows = self.db.execute('SELECT id, ts, model, prompt, response FROM exchange '
+                                       'WHERE id < ? ORDER BY id DESC LIMIT ?', (before, n)).fetchall()
+        rows.reverse()
+        return rows
+
+    def get(self, id):
+        with self.lock:
+            return self.db.execute('SELECT id, ts, model, prompt, response FROM exchange '
+                                   'WHERE id=?', (id,)).fetchone()
+
+    def search(self, text, limit=200):
+        ''' ranked full-text search over all prompts and responses
+            returns (id, ts, model, snippet) best match first '''
+        query = fts_query(text)
+        if not query:
+            return []
+        with self.lock:
+            return self.db.execute(
+                '''SELECT e.id, e.ts, e.model,
+                          snippet(exchange_fts, -1, '[', ']', ' ... ', 12)
+                   FROM exchange_fts JOIN exchange e ON e.id = exchange_fts.rowid
+                   WHERE exchange_fts MATCH ?
+                   ORDER BY bm25(exchange_fts) LIMIT ?''', (query, limit)).fetchall()
+
+    def each(self, page=1000):
+        ''' every exchange, oldest first, as (id, ts, model, prompt, response)
+            - read a page at a time so a large history is never all in memory '''
+        last = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute('SELECT id, ts, model, prompt, response FROM exchange '
+                                       'WHERE id > ? ORDER BY id LIMIT ?', (last, page)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def prompts(self, after=0):
+        ''' (id, prompt) of every exchange newer than id "after" '''
+        with self.lock:
+            return self.db.execute('SELECT id, prompt FROM exchange WHERE id > ? ORDER BY id',
+                                   (after,)).fetchall()
+
+    def count(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM exchange').fetchone()[0]
+
+    def export_markdown(self, path="log.md"):
+        ''' write the whole history in the log.md format - a page at a
+            time, so other readers are not held up by a long export '''
+        with open(path, "w", encoding='utf-8') as fout:
+            for id, ts, model, prompt, response in self.each():
+                fout.write(format_entry(ts, prompt, response))
+
+    def import_markdown(self, path="log.md"):
+        ''' load an old log.md into the history (model unknown) '''
+        with open(path, "r", encoding='utf-8') as fin:
+            text = fin.read()
+        head = re.compile(r'\n\n=================================== (.+? \d\d:\d\d)\n')
+        parts = head.split(text)
+        # parts: [before, stamp, body, stamp, body, ...]
+        for stamp, body in zip(parts[1::2], parts[2::2]):
+            prompt, _, response = body.partition("\n=====================================\n\n")
+            try:
+                ts = mktime(strptime(stamp, "%a %d %b %Y %H:%M"))
+            except ValueError:
+                ts = time()
+            self.add("", prompt, response, ts)
+        self.flush()
+
+
+def open_history(path="history.db", legacy="log.md"):
+    ''' open history.db - the first time, bring in an existing log.md '''
+    new = not os.path.isfile(path)
+    hist = History(path)
+    if new and os.path.isfile(legacy):
+        hist.import_markdown(legacy)
+    return hist
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        out = sys.argv[2] if len(sys.argv) > 2 else "log.md"
+        hist = History()
+        hist.export_markdown(out)
+        hist.close()
+        print("exported", out)
+    else:
+        print("usage: python3 history.py export [log.md]")
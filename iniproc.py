@@ -11,10 +11,11 @@ def striplist(lst):
     return L
 
 
-def read(inifile, *keys):
+def read(inifile, *keys, defaults=None):
     ''' Open and read text file having "key = value" lines
         Build a dictionary - use it to build a list of
         values to return in the order received.
+        defaults (dict) supplies keys missing from the file.
     '''
 
     kv = []  # one key/value item from ini file
@@ -40,6 +41,9 @@ def read(inifile, *keys):
         try:
             rtv.append(kvs[v])
         except:
+            if defaults and v in defaults:
+                rtv.append(defaults[v])
+                continue
             print("Key Error:", v)
             rtv.append(0)
 
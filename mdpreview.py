@@ -0,0 +1,150 @@
+# mdpreview.py
+# Incremental markdown to HTML for the live preview.
+# The text is cut into blocks (paragraphs, lists, tables, fenced code)
+# and each block is converted on its own. Converted blocks are cached
+# by a hash of their text, so only new or changed blocks - normally
+# the trailing one while an answer streams in - go through markdown.
+# Export uses render() - the whole document at once, so reference
+# links defined in another block resolve there.
+# markdown itself is imported on first use.
+
+import hashlib
+import re
+from collections import OrderedDict
+
+EXTENSIONS = ['tables', 'fenced_code']
+LIST_ITEM = re.compile(r" {0,3}([-*+]|\d+[.)])\s")
+
+
+def render(text):
+    ''' the whole document as HTML in one conversion '''
+    import markdown
+    return markdown.markdown(text, extensions=EXTENSIONS)
+
+
+def _continues_list(text, pos):
+    ''' the line at pos is another item or an indented continuation '''
+    end = text.find("\n", pos)
+    line = text[pos:] if end == -1 else text[pos:end]
+    return bool(line.strip()) and (LIST_ITEM.match(line) is not None
+                                   or line.startswith(("  ", "\t")))
+
+
+def split_blocks(text, start=0):
+    ''' (offset, block) pairs from text[start:]
+        blocks end at a blank line that is not inside a code fence
+        or between the items of a list '''
+    blocks = []
+    fence = None          # ``` or ~~~ while inside a fenced block
+    in_list = False       # the block has a list item
+    begin = start
+    pos = start
+    n = len(text)
+    while pos < n:
+        end = text.find("\n", pos)
+        end = n if end == -1 else end + 1
+        line = text[pos:end].strip()
+        if fence:
+            if line.startswith(fence):
+                fence = None
+        elif line.startswith("```") or line.startswith("~~~"):
+            fence = line[:3]
+        elif line == "":
+            if pos > begin and in_list and _continues_list(text, end):
+                pass   # a loose list - one <ol>, numbered right
+            else:
+                if pos > begin:
+                    blocks.append((begin, text[begin:pos]))
+                begin = end
+                in_list = False
+        elif LIST_ITEM.match(text[pos:end]):
+            in_list = True
+        pos = end
+    if begin < n:
+        blocks.append((begin, text[begin:n]))
+    return blocks
+
+
+class IncrementalRenderer:
+    ''' keeps the HTML of the last text it was given.
+        update() returns (first, htmls): the index of the first block
+        that changed and the HTML of that block and all after it. '''
+
+    def __init__(self, cache_size=2000):
+        self.text = ""
+        self.offsets = []     # start of each block in self.text
+        self.keys = []        # hash of each block
+        self.htmls = []       # HTML of each block
+        self.cache = OrderedDict()  # hash -> HTML, shared by all updates
+        self.cache_size = cache_size
+
+    def _convert(self, block):
+        key = hashlib.blake2b(block.encode('utf-8'), digest_size=16).digest()
+        html = self.cache.get(key)
+        if html is None:
+            import markdown
+            html = markdown.markdown(block, extensions=EXTENSIONS)
+            self.cache[key] = html
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return key, html
+
+    def update(self, text):
+        if text == self.text:
+            return len(self.htmls), []
+        # Appended text (streaming) only re-splits from the last block,
+        # or from the start of the list before it - the next item may
+        # still be joined to it.
+        if self.offsets and text.startswith(self.text):
+            keep = len(self.offsets) - 1
+            while keep > 0 and LIST_ITEM.match(self.text, self.offsets[keep - 1]):
+                keep -= 1
+            pieces = split_blocks(text, self.offsets[keep])
+        else:
+            keep = 0
+            pieces = split_blocks(text)
+        offsets = self.offsets[:keep]
+        keys = self.keys[:keep]
+        htmls = self.htmls[:keep]
+        first = None
+        for i, (offset, block) in enumerate(pieces, keep):
+            key, html = self._convert(block)
+            if first is None and (i >= len(self.keys) or self.keys[i] != key):
+                first = i
+            offsets.append(offset)
+            keys.append(key)
+            htmls.append(html)
+        if first is None:
+            first = len(keys)  # nothing new, maybe blocks were removed
+        self.text = text
+        self.offsets, self.keys, self.htmls = offsets, keys, htmls
+        return first, htmls[first:]
+
+    def html(self):
+        ''' the whole document as it was last rendered '''
+        return "\n".join(self.htmls)
+
+
+PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<style>
+body { font-family: sans-serif; margin: 1em; }
+pre { background: #f4f4f4; padding: 0.5em; overflow-x: auto; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ccc; padding: 0.2em 0.5em; }
+</style>
+<script>
+function setBlocks(first, htmls) {
+    var doc = document.getElementById('doc');
+    while (doc.children.length > first) doc.removeChild(doc.lastChild);
+    for (var i = 0; i < htmls.length; i++) {
+        var div = document.createElement('div');
+        div.innerHTML = htmls[i];
+        doc.appendChild(div);
+    }
+}
+</script>
+</head><body><div id="doc"></div></body></html>
+'''
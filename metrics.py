@@ -0,0 +1,103 @@
+# metrics.py
+# Per request latency and token telemetry.
+# One compact JSON line per request in metrics.jsonl:
+#   t  time stamp          m  model
+#   q  queue ms            c  connect ms (0 = pooled connection)
+#   f  first token ms      d  total ms (after leaving the queue)
+#   i  input tokens        o  output tokens      k  cached input tokens
+# stats() gives p50/p95/p99 latency and tokens/s per model.
+
+import json
+import math
+import threading
+from time import time
+
+
+def percentile(values, p):
+    ''' nearest-rank percentile of a sorted list '''
+    if not values:
+        return 0.0
+    i = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[i]
+
+
+def gen_secs(rec):
+    ''' seconds spent generating output: after the first token when
+        streamed, the whole request otherwise '''
+    ms = rec['d'] - rec['f'] if rec['d'] > rec['f'] else rec['d']
+    return max(ms, 1) / 1000
+
+
+def usage_counts(usage):
+    ''' (input, output, cached) tokens from a Responses API usage object '''
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, 'input_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) or 0
+    return usage.input_tokens or 0, usage.output_tokens or 0, cached
+
+
+class Metrics:
+    ''' append-only metrics file, safe to call from worker threads '''
+
+    def __init__(self, path="metrics.jsonl"):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def add(self, model, queue_ms, connect_ms, ttft_ms, total_ms, usage=None):
+        ''' record one request and return the record '''
+        tokens_in, tokens_out, cached = usage_counts(usage)
+        rec = {'t': round(time(), 1), 'm': model,
+               'q': round(queue_ms), 'c': round(connect_ms),
+               'f': round(ttft_ms), 'd': round(total_ms),
+               'i': tokens_in, 'o': tokens_out, 'k': cached}
+        line = json.dumps(rec, separators=(',', ':')) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding='utf-8') as fout:
+                fout.write(line)
+        return rec
+
+    def load(self, since=0):
+        ''' records newer than the time stamp "since" '''
+        recs = []
+        try:
+            with open(self.path, "r", encoding='utf-8') as fin:
+                for line in fin:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec['t'] >= since:
+                        recs.append(rec)
+        except FileNotFoundError:
+            pass
+        return recs
+
+    def stats(self, since=0):
+        ''' {model: {n, p50, p95, p99, ttft50, ttft95, tps}} - latencies in ms,
+            tps = output tokens per second of generation time '''
+        by_model = {}
+        for rec in self.load(since):
+            by_model.setdefault(rec['m'], []).append(rec)
+        result = {}
+        for model, recs in by_model.items():
+            total = sorted(r['d'] for r in recs)
+            ttft = sorted(r['f'] for r in recs)
+            out = sum(r['o'] for r in recs)
+            secs = sum(gen_secs(r) for r in recs if r['o'])
+            result[model] = {'n': len(recs),
+                             'p50': percentile(total, 50),
+                             'p95': percentile(total, 95),
+                             'p99': percentile(total, 99),
+                             'ttft50': percentile(ttft, 50),
+                             'ttft95': percentile(ttft, 95),
+                             'tps': out / secs if secs else 0.0}
+        return result
+
+
+def describe(rec):
+    ''' one line status bar readout for a record '''
+    tps = rec['o'] / gen_secs(rec)
+    return (f"{rec['m']}: {rec['d'] / 1000:.2f} s, first token {rec['f'] / 1000:.2f} s, "
+            f"queue {rec['q']} ms, connect {rec['c']} ms, "
+            f"{rec['i']} in / {rec['o']} out ({rec['k']} cached), {tps:.0f} tok/s")
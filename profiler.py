@@ -0,0 +1,134 @@
+# profiler.py
+# Profiling of the running app: Ctrl-Shift-P starts and stops it,
+# "python3 wxAI.py --profile" starts it with the window and reports
+# when the window closes.
+# While it runs:
+#  - every MyFrame event handler (on_* and the names given to
+#    @handlers) counts its calls and time, on any thread
+#  - cProfile records the UI thread
+#  - tracemalloc snapshots are taken at start and stop
+# stop() writes profile-YYYYmmdd-HHMMSS.txt (handlers, cProfile by
+# cumulative time, top allocators) and the raw .prof for pstats.
+# When off a handler costs one flag test more than a plain call, and
+# cProfile, pstats and tracemalloc are not even imported.
+
+import functools
+import threading
+from time import perf_counter, strftime
+
+enabled = False
+_calls = {}    # handler name -> [calls, seconds, max seconds]
+_lock = threading.Lock()
+_profile = None
+_snapshot = None
+_started = 0.0
+
+
+def _record(name, secs):
+    with _lock:
+        c = _calls.get(name)
+        if c is None:
+            _calls[name] = [1, secs, secs]
+        else:
+            c[0] += 1
+            c[1] += secs
+            if secs > c[2]:
+                c[2] = secs
+
+
+def timed(fn):
+    ''' count calls and time of fn while profiling is on '''
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return fn(*args, **kwargs)
+        t0 = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record(name, perf_counter() - t0)
+    return wrapper
+
+
+def handlers(*names):
+    ''' class decorator: @timed on every on_* method and on names '''
+    def decorate(cls):
+        for name, value in list(vars(cls).items()):
+            if callable(value) and (name.startswith("on_") or name in names):
+                setattr(cls, name, timed(value))
+        return cls
+    return decorate
+
+
+def start():
+    ''' UI thread: begin recording '''
+    global enabled, _profile, _snapshot, _started
+    if enabled:
+        return
+    import cProfile
+    import tracemalloc
+    with _lock:
+        _calls.clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+    _snapshot = tracemalloc.take_snapshot()
+    _profile = cProfile.Profile()
+    _started = perf_counter()
+    enabled = True
+    _profile.enable()
+
+
+def stop(top=25):
+    ''' UI thread: stop recording and write the report, return its path '''
+    global enabled
+    if not enabled:
+        return None
+    import io
+    import pstats
+    import tracemalloc
+    _profile.disable()
+    enabled = False
+    secs = perf_counter() - _started
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    base = "profile-" + strftime("%Y%m%d-%H%M%S")
+    _profile.dump_stats(base + ".prof")
+    with open(base + ".txt", "w", encoding='utf-8') as fout:
+        fout.write(f"wxAI profile  {strftime('%a %d %b %Y %H:%M:%S')}  {secs:.1f} s recorded\n\n")
+        fout.write(handler_table())
+        fout.write(f"\n\ncProfile of the UI thread, top {top} by cumulative time\n")
+        out = io.StringIO()
+        pstats.Stats(_profile, stream=out).strip_dirs().sort_stats("cumulative").print_stats(top)
+        fout.write(out.getvalue())
+        fout.write(allocators(snapshot, top))
+    return base + ".txt"
+
+
+def handler_table():
+    with _lock:
+        rows = sorted(_calls.items(), key=lambda r: -r[1][1])
+    lines = ["Event handlers (all threads)",
+             f"{'handler':40} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+    for name, (n, total, worst) in rows:
+        lines.append(f"{name:40} {n:7d} {total * 1000:10.1f} {total / n * 1000:9.2f} {worst * 1000:9.1f}")
+    if not rows:
+        lines.append("(no handler ran)")
+    return "\n".join(lines) + "\n"
+
+
+def allocators(snapshot, top):
+    ''' the lines that grew memory most since start(), then the
+        biggest holders of memory now '''
+    import tracemalloc
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+              tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    snapshot = snapshot.filter_traces(ignore)
+    lines = [f"\nMemory growth since start, top {top}"]
+    for stat in snapshot.compare_to(_snapshot.filter_traces(ignore), "lineno")[:top]:
+        lines.append(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  {stat.traceback}")
+    lines.append(f"\nLargest allocators now, top {top}")
+    for stat in snapshot.statistics("lineno")[:top]:
+        lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback}")
+    return "\n".join(lines) + "\n"
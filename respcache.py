@@ -0,0 +1,99 @@
+# respcache.py
+# Two tier response cache in front of the OpenAI request.
+#   memory: LRU OrderedDict - a hit costs a dict lookup
+#   disk:   one SQLite file (cache.db) so answers survive restarts
+# Entries are keyed on a hash of (model, role, normalized prompt).
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from time import time
+
+
+def make_key(model, role, prompt):
+    ''' hash of model, role/instructions and the prompt with
+        surrounding and repeated white space removed '''
+    norm = " ".join(prompt.split())
+    raw = "\0".join((model, role, norm))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    ''' LRU memory cache backed by an SQLite file
+        entries:  max entries held in memory
+        disk_mb:  max size of the stored answers on disk
+        ttl:      seconds an entry stays valid (0 = forever)
+    '''
+
+    def __init__(self, path="cache.db", entries=200, disk_mb=50, ttl=0):
+        self.entries = int(entries)
+        self.disk_bytes = int(float(disk_mb) * 1024 * 1024)
+        self.ttl = float(ttl)
+        self.mem = OrderedDict()  # key -> (created, text)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS cache (
+                             key TEXT PRIMARY KEY,
+                             created REAL,
+                             used REAL,
+                             size INTEGER,
+                             text TEXT)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS cache_used ON cache(used)')
+        self.db.commit()
+
+    def _expired(self, created):
+        return self.ttl > 0 and time() - created > self.ttl
+
+    def get(self, key):
+        ''' return the cached text or None '''
+        with self.lock:
+            item = self.mem.get(key)
+            if item is not None:
+                if not self._expired(item[0]):
+                    self.mem.move_to_end(key)
+                    return item[1]
+                del self.mem[key]
+            row = self.db.execute('SELECT created, text FROM cache WHERE key=?',
+                                  (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[0]):
+                self.db.execute('DELETE FROM cache WHERE key=?', (key,))
+                self.db.commit()
+                return None
+            self.db.execute('UPDATE cache SET used=? WHERE key=?', (time(), key))
+            self.db.commit()
+            self._remember(key, row[0], row[1])
+            return row[1]
+
+    def put(self, key, text):
+        ''' store (or refresh) an answer in both tiers '''
+        now = time()
+        with self.lock:
+            self._remember(key, now, text)
+            self.db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                            (key, now, now, len(text.encode('utf-8')), text))
+            self._prune()
+            self.db.commit()
+
+    def _remember(self, key, created, text):
+        self.mem[key] = (created, text)
+        self.mem.move_to_end(key)
+        while len(self.mem) > self.entries:
+            self.mem.popitem(last=False)
+
+    def _prune(self):
+        ''' drop expired entries, then least recently used ones
+            until the disk tier fits in disk_bytes '''
+        if self.ttl > 0:
+            self.db.execute('DELETE FROM cache WHERE created < ?', (time() - self.ttl,))
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        if total <= self.disk_bytes:
+            return
+        for key, size in self.db.execute('SELECT key, size FROM cache ORDER BY used').fetchall():
+            self.db.execute('DELETE FROM cache WHERE key=?', (key,))
+            self.mem.pop(key, None)
+            total -= size
+            if total <= self.disk_bytes:
+                break
@@ -0,0 +1,192 @@
+# retry.py
+# Cancel, retry and hedge API requests.
+# A CancelToken is shared by the GUI (Esc) and the worker thread;
+# cancelling it closes open streams and wakes up anyone waiting.
+# with_retries() retries rate limits, timeouts and server errors with
+# exponential backoff and full jitter, and never retries sooner than a
+# 429 Retry-After asks. hedged() starts a second copy of a request
+# that is slower than usual and keeps whichever answers first.
+
+import queue
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from time import time
+
+RETRY_STATUS = (408, 409, 429)   # plus every 5xx
+
+
+class Cancelled(Exception):
+    ''' the request was cancelled '''
+
+
+class CancelToken:
+    ''' set once by cancel(); children are cancelled with their parent '''
+
+    def __init__(self, parent=None):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+        if parent is not None:
+            parent.on_cancel(self.cancel)
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                pass   # e.g. closing a stream that already ended
+
+    def on_cancel(self, fn):
+        ''' call fn() on cancel - at once if already cancelled '''
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(fn)
+                return
+        fn()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled("Request cancelled")
+
+    def sleep(self, secs):
+        ''' wait secs seconds, raise Cancelled if cancelled meanwhile '''
+        if self.event.wait(secs):
+            raise Cancelled("Request cancelled")
+
+
+def retryable(exc):
+    ''' rate limits, timeouts, connection and server errors '''
+    status = getattr(exc, 'status_code', None)
+    if status is not None:
+        return status in RETRY_STATUS or status >= 500
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after(exc):
+    ''' seconds the server asked us to wait, or None '''
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return float(ms) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt, base, cap, exc=None):
+    ''' seconds to wait before retry number attempt (0 based) '''
+    wait = random.uniform(0, min(cap, base * 2 ** attempt))   # full jitter
+    hint = retry_after(exc) if exc is not None else None
+    if hint is not None:
+        wait = hint + random.uniform(0, base)   # not before the server says
+    return wait
+
+
+def with_retries(call, token, retries=3, base=0.5, cap=20.0, can_retry=None, on_retry=None):
+    ''' return call(), retrying retryable errors up to retries times.
+        can_retry() - optional - says whether a retry is still safe
+        (not once streamed text has been shown).
+        on_retry(attempt, wait, exc) is told about each retry. '''
+    attempt = 0
+    while True:
+        token.check()
+        try:
+            return call()
+        except Cancelled:
+            raise
+        except Exception as e:
+            if token.cancelled:
+                raise Cancelled("Request cancelled") from e
+            if attempt >= retries or not retryable(e) or (can_retry and not can_retry()):
+                raise
+            wait = backoff(attempt, base, cap, e)
+            if on_retry:
+                on_retry(attempt + 1, wait, e)
+            token.sleep(wait)
+            attempt += 1
+
+
+def hedged(attempt, token, delay=None, on_hedge=None):
+    ''' run attempt(tok, claim) on a worker thread and return its result.
+        If it has not claimed after delay seconds a second copy is started.
+        An attempt calls claim() before it shows anything (its first
+        streamed text, or its answer): the first caller wins and the
+        other copy is cancelled, claim() returns False to the loser.
+        Returns at once with Cancelled when token is cancelled, even if
+        a plain (not streamed) request is still waiting for the server. '''
+    results = queue.Queue()
+    lock = threading.Lock()
+    tokens = []
+    state = {'winner': None}
+
+    def run(tok):
+        def claim():
+            with lock:
+                if state['winner'] is None:
+                    state['winner'] = tok
+                    for other in tokens:
+                        if other is not tok:
+                            other.cancel()
+                return state['winner'] is tok
+        try:
+            value = attempt(tok, claim)
+            results.put((tok, value, None) if claim() else (tok, None, Cancelled("Lost the race")))
+        except Exception as e:
+            results.put((tok, None, e))
+
+    def start():
+        tok = CancelToken(token)
+        with lock:
+            tokens.append(tok)
+        threading.Thread(target=run, args=(tok,), daemon=True).start()
+
+    token.on_cancel(lambda: results.put(None))
+    start()
+    running = 1
+    waiting = delay   # None once no copy will be started any more
+    error = None
+    while True:
+        try:
+            item = results.get(timeout=waiting)
+        except queue.Empty:
+            waiting = None
+            with lock:
+                won = state['winner'] is not None
+            if not won:
+                start()
+                running += 1
+                if on_hedge:
+                    on_hedge()
+            continue
+        if item is None:
+            raise Cancelled("Request cancelled")
+        tok, value, exc = item
+        running -= 1
+        if exc is None:
+            return value
+        if state['winner'] is tok:
+            raise exc   # failed after showing text - the other copy is gone
+        if error is None or isinstance(error, Cancelled):
+            error = exc
+        if running == 0:
+            raise error
@@ -0,0 +1,124 @@
+# router.py
+# Pick a model per prompt from an ordered list of tiers (small and
+# fast first, large last) instead of always using "model".
+#  1. size: tokens in the prompt - tiktoken when it is installed and
+#     its encoding has been loaded (on a background thread - the first
+#     time it is downloaded), otherwise about 4 characters a token
+#  2. class: cheap heuristics (short question, code, long document,
+#     reasoning words) give the smallest tier that is good enough
+#  3. speed: of the adequate tiers, the one with the lowest expected
+#     time from metrics.stats() - first token plus output tokens at
+#     the model's tokens/s - wins; without statistics the smallest
+# Every decision is appended to routing.jsonl with its reasons.
+
+import json
+import re
+import threading
+from time import time
+
+HARD = re.compile(r"\b(refactor|architect|design|prove|proof|optimi[sz]e|debug|analy[sz]e|"
+                  r"review|trade-?offs?|step by step|explain why|compare|migrate|rewrite)\w*", re.I)
+CODE = re.compile(r"```|^\s*(def|class|import|from|function|public|#include|SELECT)\b|[;{}]\s*$",
+                  re.M)
+
+# (tokens expected in the answer, minimum tier) for each class
+CLASSES = {
+    'short':    (150, 0),
+    'general':  (400, 0),
+    'code':     (700, 1),
+    'long':     (800, 1),
+    'hard':     (1200, 2),
+}
+
+
+_encodings = {}   # model -> tiktoken encoding, or None when it can't be had
+
+
+def load_encoding(model):
+    ''' background thread: tiktoken's encoding for model. None when
+        tiktoken is not installed or the download fails (offline) '''
+    try:
+        import tiktoken   # optional - exact token counts
+        try:
+            enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            enc = tiktoken.get_encoding("o200k_base")
+    except Exception:
+        enc = None
+    _encodings[model] = enc
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    ''' exact once load_encoding(model) succeeded, estimated until then '''
+    enc = _encodings.get(model)
+    if enc is not None:
+        try:
+            return len(enc.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return len(text) // 4 + 1
+
+
+def classify(text, tokens):
+    ''' (class, reason) from cheap looks at the prompt '''
+    hard = HARD.search(text)
+    if hard:
+        return 'hard', f"asks to {hard.group(0).lower()}"
+    if tokens > 3000:
+        return 'long', f"{tokens} tokens"
+    if len(CODE.findall(text)) >= 2:
+        return 'code', "contains code"
+    if tokens < 40 and text.count("\n") < 2:
+        return 'short', "short question"
+    return 'general', "general prompt"
+
+
+class Decision:
+    def __init__(self, model, kind, tokens, reason):
+        self.model = model
+        self.kind = kind
+        self.tokens = tokens
+        self.reason = reason
+
+
+class Router:
+    ''' tiers: model names, smallest first '''
+
+    def __init__(self, tiers, path="routing.jsonl"):
+        self.tiers = tiers
+        self.path = path
+        self.lock = threading.Lock()
+        threading.Thread(target=load_encoding, args=(tiers[0],), name="tiktoken",
+                         daemon=True).start()
+
+    def choose(self, text, stats):
+        ''' Decision for text. stats is metrics.stats() - {model: {...}} '''
+        tokens = count_tokens(text, self.tiers[0])
+        kind, why = classify(text, tokens)
+        out_tokens, level = CLASSES[kind]
+        level = min(level, len(self.tiers) - 1)
+        best = None
+        for model in self.tiers[level:]:
+            s = stats.get(model)
+            if not s or not s['tps']:
+                continue
+            secs = (s['ttft50'] + out_tokens / s['tps'] * 1000) / 1000
+            if best is None or secs < best[0]:
+                best = (secs, model)
+        if best is None:
+            model = self.tiers[level]
+            reason = f"{why}; smallest adequate tier (no statistics yet)"
+        else:
+            model = best[1]
+            reason = f"{why}; fastest adequate tier, ~{best[0]:.1f} s expected"
+        return Decision(model, kind, tokens, reason)
+
+    def log(self, decision, chosen=None):
+        ''' record a decision - chosen is set when the user overrode it '''
+        rec = {'t': round(time(), 1), 'routed': decision.model, 'class': decision.kind,
+               'tokens': decision.tokens, 'reason': decision.reason}
+        if chosen and chosen != decision.model:
+            rec['override'] = chosen
+        with self.lock:
+            with open(self.path, "a", encoding='utf-8') as fout:
+                fout.write(json.dumps(rec) + "\n")
@@ -0,0 +1,209 @@
+# semcache.py
+# Semantic near-duplicate lookup over the prompts in history.db.
+# Every logged prompt is embedded into a DIM-wide unit vector; the
+# vectors sit in one preallocated NumPy float32 matrix, so a lookup is
+# a single matrix-vector product (about 3 ms at 100k prompts; 128
+# dimensions keeps the matrix at 50 MB and the product memory bound).
+# The index is saved to semantic.npz and only prompts added to the
+# history since then are embedded at the next start.
+#
+# Embedders are pluggable - anything with name, dim and embed(text):
+#   HashingEmbedder  local and offline: TF-IDF weighted word and word
+#                    pair features folded into DIM signed buckets
+#   OpenAIEmbedder   the embeddings API (text-embedding-3-small)
+#
+# NumPy is optional for wxAI; without it the semantic cache is off.
+
+import math
+import re
+import threading
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DIM = 128
+DF_SLOTS = 1 << 18   # hashed document frequency table for the IDF
+TOKEN = re.compile(r"[a-z0-9_]+")
+STOP = set('''a an and are as at be but by can could do does for from how i if in
+    into is it me my of on or please should so some that the their then there
+    these this to was we what when where which who why will with would you your
+    all any every each'''.split())
+
+
+class HashingEmbedder:
+    ''' offline TF-IDF feature hashing. Document frequencies are
+        learnt from the prompts as they are added. '''
+    name = "hashing"
+
+    def __init__(self, dim=DIM):
+        self.dim = dim
+        self.df = numpy.zeros(DF_SLOTS, dtype=numpy.int32)
+        self.docs = 0
+
+    def features(self, text):
+        ''' {hash: weight} of the words (plural "s" dropped) and word
+            pairs, leaving out common words '''
+        words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+                 for w in TOKEN.findall(text.lower()) if w not in STOP]
+        feats = {zlib.crc32(w.encode('utf-8')): 1.0 for w in words}
+        for a, b in zip(words, words[1:]):   # pairs keep some word order
+            feats[zlib.crc32((a + " " + b).encode('utf-8'))] = 0.5
+        return feats
+
+    def learn(self, text):
+        ''' count the prompt's features for the IDF '''
+        hashes = list(self.features(text))
+        if hashes:
+            self.df[numpy.array(hashes, dtype=numpy.uint32) % DF_SLOTS] += 1
+        self.docs += 1
+
+    def embed(self, text):
+        vec = numpy.zeros(self.dim, dtype=numpy.float32)
+        for h, weight in self.features(text).items():
+            idf = math.log((1 + self.docs) / (1 + self.df[h % DF_SLOTS])) + 1
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vec[h % self.dim] += sign * weight * idf
+        norm = numpy.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def state(self):
+        return {'df': self.df, 'docs': numpy.array([self.docs])}
+
+    def load_state(self, data):
+        self.df = data['df']
+        self.docs = int(data['docs'][0])
+
+
+class OpenAIEmbedder:
+    ''' the embeddings API - better matches, one request per prompt.
+        A short timeout: a lookup runs while the user waits. '''
+
+    def __init__(self, key, model="text-embedding-3-small", dim=DIM, timeout=5):
+        self.key = key
+        self.model = model
+        self.dim = dim
+        self.timeout = timeout
+        self.client = None
+        self.name = "openai:" + model
+
+    def learn(self, text):
+        pass
+
+    def embed(self, text):
+        import aiclient
+        if self.client is None:   # shares the pooled connections of get_client
+            self.client = aiclient.get_client(self.key).with_options(timeout=self.timeout,
+                                                                     max_retries=0)
+        response = self.client.embeddings.create(
+            model=self.model, input=text.strip() or " ", dimensions=self.dim)
+        vec = numpy.array(response.data[0].embedding, dtype=numpy.float32)
+        norm = numpy.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def state(self):
+        return {}
+
+    def load_state(self, data):
+        pass
+
+
+def make_embedder(spec, key):
+    ''' "hashing" or "openai[:model]" from options.ini '''
+    name, _, model = spec.partition(":")
+    if name.strip().lower() == "openai":
+        return OpenAIEmbedder(key, model.strip() or "text-embedding-3-small")
+    return HashingEmbedder()
+
+
+class SemanticIndex:
+    ''' prompt vectors keyed by history id '''
+
+    def __init__(self, embedder, path="semantic.npz"):
+        self.embedder = embedder
+        self.path = path
+        self.lock = threading.Lock()
+        self.vectors = numpy.zeros((1024, embedder.dim), dtype=numpy.float32)
+        self.ids = numpy.zeros(1024, dtype=numpy.int64)
+        self.n = 0
+        self.last_id = 0   # newest history id in the index
+        self.dirty = False
+
+    def load(self):
+        ''' read semantic.npz if it was built by the same embedder '''
+        try:
+            data = numpy.load(self.path)
+        except (OSError, ValueError):
+            return False
+        with data:
+            if (str(data['embedder']) != self.embedder.name
+                    or data['vectors'].shape[1] != self.embedder.dim):
+                return False
+            n = len(data['ids'])
+            self._grow(n)
+            self.vectors[:n] = data['vectors']
+            self.ids[:n] = data['ids']
+            self.n = n
+            self.last_id = int(data['last_id'][0])
+            self.embedder.load_state(data)
+        return True
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            numpy.savez(self.path, embedder=numpy.array(self.embedder.name),
+                        vectors=self.vectors[:self.n], ids=self.ids[:self.n],
+                        last_id=numpy.array([self.last_id]), **self.embedder.state())
+            self.dirty = False
+
+    def _grow(self, n):
+        if n <= len(self.ids):
+            return
+        size = max(n, len(self.ids) * 2)
+        vectors = numpy.zeros((size, self.embedder.dim), dtype=numpy.float32)
+        vectors[:self.n] = self.vectors[:self.n]
+        ids = numpy.zeros(size, dtype=numpy.int64)
+        ids[:self.n] = self.ids[:self.n]
+        self.vectors, self.ids = vectors, ids
+
+    def add(self, id, prompt):
+        vec = self.embedder.embed(prompt)
+        with self.lock:
+            self._grow(self.n + 1)
+            self.vectors[self.n] = vec
+            self.ids[self.n] = id
+            self.n += 1
+            self.last_id = max(self.last_id, id)
+            self.dirty = True
+
+    def sync(self, hist):
+        ''' add the history prompts logged since the last sync '''
+        rows = hist.prompts(self.last_id)
+        for id, prompt in rows:   # IDF first, so the whole batch is weighted alike
+            self.embedder.learn(prompt)
+        for id, prompt in rows:
+            self.add(id, prompt)
+        return len(rows)
+
+    def lookup(self, prompt):
+        ''' (similarity, history id) of the closest prompt, or None '''
+        if not self.n:
+            return None
+        vec = self.embedder.embed(prompt)
+        with self.lock:
+            scores = self.vectors[:self.n] @ vec
+            i = int(numpy.argmax(scores))
+            return float(scores[i]), int(self.ids[i])
+
+
+def open_index(spec, key, hist, path="semantic.npz"):
+    ''' load the saved index and bring it up to date with hist
+        - slow the first time, meant for a background thread '''
+    index = SemanticIndex(make_embedder(spec, key), path)
+    index.load()
+    index.sync(hist)
+    index.save()
+    return index
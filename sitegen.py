@@ -0,0 +1,215 @@
+# sitegen.py
+# Export the whole history as a static HTML site.
+#
+#   python3 sitegen.py [site] [--per-page 50] [--workers N]
+#
+#   site/index.html          the pages, newest first, with dates
+#   site/page-0001.html ...  per_page exchanges each, oldest first,
+#                            so new exchanges only change the last page
+#   site/fragments/ID.html   one rendered exchange
+#   site/manifest.json       content hash of every exchange and page
+#
+# Exchanges are rendered (markdown -> HTML) on a process pool, one
+# per core. On a re-export only exchanges whose hash changed, and the
+# pages that hold them, are written again.
+
+import argparse
+import concurrent.futures
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import sys
+from time import localtime, strftime, perf_counter
+import history
+
+VERSION = "1"   # change to render everything again after a layout change
+BATCH = 2000    # exchanges handed to the pool at a time
+
+STYLE = '''<style>
+body { font-family: sans-serif; margin: 1em auto; max-width: 60em; padding: 0 1em; }
+pre { background: #f4f4f4; padding: 0.5em; overflow-x: auto; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ccc; padding: 0.2em 0.5em; }
+article { border-top: 2px solid #888; margin-top: 2em; }
+.prompt { white-space: pre-wrap; background: #eef3fa; padding: 0.5em; }
+.model { color: #777; font-size: 0.8em; }
+nav { margin: 1em 0; }
+</style>'''
+
+
+def entry_hash(row):
+    id, ts, model, prompt, response = row
+    raw = "\0".join((VERSION, str(ts), model or "", prompt, response))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def title(prompt, n=80):
+    line = prompt.strip().split("\n", 1)[0]
+    return line if len(line) <= n else line[:n] + " ..."
+
+
+def render_entry(row):
+    ''' worker process: (id, HTML of one exchange) '''
+    import markdown
+    id, ts, model, prompt, response = row
+    return id, (f'<article id="e{id}">\n'
+                f'<h2><a href="#e{id}">{strftime("%a %d %b %Y %H:%M", localtime(ts))}</a> '
+                f'<span class="model">{html.escape(model or "")}</span></h2>\n'
+                f'<div class="prompt">{html.escape(prompt)}</div>\n'
+                f'<div class="response">{markdown.markdown(response, extensions=["tables", "fenced_code"])}</div>\n'
+                f'</article>\n')
+
+
+def page_name(n):
+    return f"page-{n:04d}.html"
+
+
+def write(path, text):
+    with open(path, "w", encoding='utf-8') as fout:
+        fout.write(text)
+
+
+class Site:
+    ''' one export directory and its manifest '''
+
+    def __init__(self, out, per_page=50):
+        self.out = out
+        self.per_page = per_page
+        self.frags = os.path.join(out, "fragments")
+        os.makedirs(self.frags, exist_ok=True)
+        self.manifest_path = os.path.join(out, "manifest.json")
+        try:
+            with open(self.manifest_path, "r", encoding='utf-8') as fin:
+                self.manifest = json.load(fin)
+        except (OSError, ValueError):
+            self.manifest = {}
+        if self.manifest.get('version') != VERSION:
+            self.manifest = {'version': VERSION, 'entries': {}, 'pages': {}}
+        self.manifest['entries'] = {int(k): v for k, v in self.manifest['entries'].items()}
+
+    def save_manifest(self):
+        write(self.manifest_path, json.dumps(self.manifest))
+
+    def export(self, hist, workers=None):
+        ''' bring the site up to date with hist, return (rendered, pages written) '''
+        old = self.manifest['entries']
+        entries = {}     # id -> hash of every exchange now in the history
+        info = []        # (id, ts, title) oldest first, for pages and the index
+        todo = []
+        rendered = 0
+        self.workers = workers or os.cpu_count() or 1
+        # spawn: the parent has threads (the history writer), fork is unsafe then
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for row in hist.each():
+                h = entry_hash(row)
+                entries[row[0]] = h
+                info.append((row[0], row[1], title(row[3])))
+                if old.get(row[0]) != h or not os.path.isfile(self.fragment(row[0])):
+                    todo.append(row)
+                    if len(todo) == BATCH:
+                        rendered += self._render(pool, todo)
+                        todo = []
+            rendered += self._render(pool, todo)
+        for id in set(old) - set(entries):   # removed from the history
+            try:
+                os.remove(self.fragment(id))
+            except OSError:
+                pass
+        self.manifest['entries'] = entries
+        pages = self._pages(info, entries)
+        self.save_manifest()
+        return rendered, pages
+
+    def fragment(self, id):
+        return os.path.join(self.frags, f"{id}.html")
+
+    def _render(self, pool, rows):
+        chunk = max(1, len(rows) // (4 * self.workers))
+        for id, text in pool.map(render_entry, rows, chunksize=chunk):
+            write(self.fragment(id), text)
+        return len(rows)
+
+    def _pages(self, info, entries):
+        ''' write the pages whose exchanges changed, and the index '''
+        old = self.manifest['pages']
+        pages = {}
+        written = 0
+        chunks = [info[i:i + self.per_page] for i in range(0, len(info), self.per_page)]
+        for n, chunk in enumerate(chunks, 1):
+            name = page_name(n)
+            last = "last" if n == len(chunks) else ""   # the last page has no "newer" link
+            raw = "\0".join([VERSION, last, str(self.per_page)] +
+                            [entries[id] for id, _, _ in chunk])
+            h = hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+            pages[name] = h
+            if old.get(name) == h and os.path.isfile(os.path.join(self.out, name)):
+                continue
+            self._write_page(n, len(chunks), chunk)
+            written += 1
+        for name in set(old) - set(pages):
+            try:
+                os.remove(os.path.join(self.out, name))
+            except OSError:
+                pass
+        self.manifest['pages'] = pages
+        self._write_index(chunks)
+        return written
+
+    def _nav(self, n, count):
+        links = ['<a href="index.html">index</a>']
+        if n > 1:
+            links.append(f'<a href="{page_name(n - 1)}">older</a>')
+        if n < count:
+            links.append(f'<a href="{page_name(n + 1)}">newer</a>')
+        return f'<nav>{" | ".join(links)} &nbsp; page {n}</nav>\n'
+
+    def _write_page(self, n, count, chunk):
+        parts = [f'<!DOCTYPE html>\n<html><head><meta charset="utf-8">\n'
+                 f'<title>wxAI history - page {n}</title>\n{STYLE}\n</head><body>\n',
+                 self._nav(n, count), "<ul>\n"]
+        parts += [f'<li><a href="#e{id}">{html.escape(t)}</a></li>\n' for id, _, t in chunk]
+        parts.append("</ul>\n")
+        for id, _, _ in chunk:
+            with open(self.fragment(id), "r", encoding='utf-8') as fin:
+                parts.append(fin.read())
+        parts += [self._nav(n, count), "</body></html>\n"]
+        write(os.path.join(self.out, page_name(n)), "".join(parts))
+
+    def _write_index(self, chunks):
+        day = lambda ts: strftime("%d %b %Y", localtime(ts))
+        parts = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8">\n'
+                 f'<title>wxAI history</title>\n{STYLE}\n</head><body>\n'
+                 f'<h1>wxAI history</h1>\n<p>{sum(len(c) for c in chunks)} exchanges</p>\n<ul>\n']
+        for n in range(len(chunks), 0, -1):
+            chunk = chunks[n - 1]
+            parts.append(f'<li><a href="{page_name(n)}">{day(chunk[0][1])} - {day(chunk[-1][1])}</a> '
+                         f'({len(chunk)}) {html.escape(chunk[-1][2])}</li>\n')
+        parts.append("</ul>\n</body></html>\n")
+        write(os.path.join(self.out, "index.html"), "".join(parts))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="export history.db as a static HTML site")
+    ap.add_argument('out', nargs='?', default="site")
+    ap.add_argument('--db', default="history.db")
+    ap.add_argument('--per-page', type=int, default=50)
+    ap.add_argument('--workers', type=int, default=None, help="processes (default: one per core)")
+    args = ap.parse_args()
+    if not os.path.isfile(args.db):
+        print("no", args.db, file=sys.stderr)
+        return 1
+    t0 = perf_counter()
+    hist = history.History(args.db)
+    site = Site(args.out, args.per_page)
+    rendered, pages = site.export(hist, args.workers)
+    hist.close()
+    print(f"{rendered} exchanges rendered, {pages} pages written in {perf_counter() - t0:.1f} s "
+          f"-> {os.path.join(args.out, 'index.html')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# startup.py
+# Cold start measurement for "python3 wxAI.py --startup-profile".
+# While enabled every top level import is timed (including the
+# modules it pulls in) and named points such as the first paint
+# are marked. report() prints the table to stderr.
+# When not enabled nothing here is hooked in.
+
+import builtins
+import sys
+import threading
+from time import perf_counter
+
+T0 = perf_counter()      # as early as wxAI.py can take it
+enabled = False
+imports = []             # (module, ms, thread name)
+marks = []               # (label, ms since start)
+_depth = threading.local()
+_real_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    ''' builtins.__import__ replacement - times outermost imports only '''
+    depth = getattr(_depth, 'n', 0)
+    if depth or level or name in sys.modules:
+        _depth.n = depth + 1
+        try:
+            return _real_import(name, globals, locals, fromlist, level)
+        finally:
+            _depth.n = depth
+    _depth.n = 1
+    t0 = perf_counter()
+    try:
+        return _real_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth.n = 0
+        imports.append((name, (perf_counter() - t0) * 1000, threading.current_thread().name))
+
+
+def start():
+    global enabled
+    enabled = True
+    builtins.__import__ = _timed_import
+
+
+def mark(label):
+    if enabled:
+        marks.append((label, (perf_counter() - T0) * 1000))
+
+
+def report(out=sys.stderr):
+    ''' print import times and marks, then unhook the import timer '''
+    global enabled
+    if not enabled:
+        return
+    enabled = False
+    builtins.__import__ = _real_import
+    print("\nwxAI startup profile", file=out)
+    print(f"{'import':30} {'ms':>9}  thread", file=out)
+    for name, ms, thread in sorted(imports, key=lambda i: -i[1]):
+        if ms >= 0.5:
+            print(f"{name:30} {ms:9.1f}  {thread}", file=out)
+    print(f"\n{'milestone':30} {'ms':>9}", file=out)
+    for label, ms in marks:
+        print(f"{label:30} {ms:9.1f}", file=out)
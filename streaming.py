@@ -0,0 +1,75 @@
+# streaming.py
+# Consume an OpenAI Responses API event stream on a worker thread
+# and hand the text to the GUI in batches.
+# Nothing in here touches wx - the caller passes in a "post"
+# function (normally a wx.CallAfter wrapper).
+
+from time import perf_counter
+
+
+class StreamBuffer:
+    ''' Collect text deltas from a worker thread and pass them
+        on in batches, at most once every "interval" seconds.
+        Call flush() when the stream ends to send the remainder.
+    '''
+
+    def __init__(self, post, interval=0.05):
+        self.post = post          # function called with each batch
+        self.interval = interval  # minimum seconds between batches
+        self.parts = []
+        self.last = 0.0
+
+    def add(self, delta):
+        self.parts.append(delta)
+        now = perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            chunk = "".join(self.parts)
+            self.parts = []
+            self.post(chunk)
+
+
+def stream_text(client, model, query, on_delta, stats=None,
+                instructions=None, previous_id=None, cancel=None):
+    ''' Send query with stream=True, call on_delta(text) for every
+        output text delta and return the complete answer.
+        query is the prompt text or a list of input items (attach.py).
+        stats (a dict) receives 'first' - perf_counter() of the first
+        delta - plus 'id' and 'usage' of the completed response.
+        cancel (retry.CancelToken) closes the stream when it is cancelled.
+    '''
+    if stats is None:
+        stats = {}
+    params = {}
+    if instructions:
+        params['instructions'] = instructions
+    if previous_id:
+        params['previous_response_id'] = previous_id
+    parts = []
+    stream = client.responses.create(
+        model=model,
+        input=query.strip() if isinstance(query, str) else query,
+        stream=True,
+        **params
+    )
+    if cancel is not None:
+        cancel.on_cancel(stream.close)
+        cancel.check()
+    for event in stream:
+        if event.type == "response.output_text.delta":
+            if not parts:
+                stats['first'] = perf_counter()
+            parts.append(event.delta)
+            on_delta(event.delta)
+        elif event.type == "response.completed":
+            stats['id'] = event.response.id
+            stats['usage'] = event.response.usage
+        elif event.type == "error":
+            raise RuntimeError(event.message)
+        elif event.type == "response.failed":
+            raise RuntimeError(str(event.response.error))
+    return "".join(parts)
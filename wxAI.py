@@ -1,15 +1,53 @@
 #
 # wxAI.py
 # wxPython GUI with OpenAI API`
+# Heavy modules (openai, httpx, markdown, webbrowser, wx.html2, numpy) are
+# imported when first needed or on a background thread after the
+# window is shown.  --startup-profile prints the import times,
+# --profile records the session (see profiler.py, Ctrl-Shift-P).
 #
+import sys
+import startup
+if '--startup-profile' in sys.argv:
+    startup.start()
 import os
 import iniproc
-import markdown
-import webbrowser
 import wx
 import platform
-from time import localtime, strftime
-from openai import OpenAI
+import threading
+import concurrent.futures
+import streaming
+import aiclient
+import respcache
+import history
+import metrics
+import conversation
+import findengine
+import retry
+import codeblocks
+import attach
+import profiler
+import mdpreview
+import json
+import re
+from time import localtime, strftime, perf_counter, time
+startup.mark("modules imported")
+html2 = None   # wx.html2, imported by the first Ctrl-P
+
+# options added since the first release - an older options.ini
+# without them gets these values
+DEFAULTS = {
+    'stream': "on", 'flush_ms': "50", 'base_url': "", 'pool_max': "10",
+    'pool_keepalive': "5", 'connect_timeout': "10", 'read_timeout': "120",
+    'warmup': "on", 'cache': "on", 'cache_entries': "200", 'cache_disk_mb': "50",
+    'cache_ttl': "604800", 'history_page': "20", 'batch_workers': "8",
+    'batch_rpm': "500", 'batch_tpm': "200000", 'models': "gpt-4o-mini,gpt-4.1-nano",
+    'workers': "4", 'preload': "on", 'metrics': "on", 'conversation': "off",
+    'conv_budget': "16000", 'retries': "3", 'backoff_ms': "500",
+    'backoff_max_ms': "20000", 'hedge': "off", 'daemon': "", 'semantic': "off",
+    'semantic_threshold': "0.80", 'semantic_embedder': "hashing", 'route': "off",
+    'route_tiers': "gpt-4.1-nano,gpt-4o-mini,gpt-4.1", 'attach_inline_kb': "32",
+}
 
 opts = [] # loading options from the options.ini file into a list
 opts = iniproc.read("options.ini",'openai',     # 0
@@ -17,7 +55,44 @@ opts = iniproc.read("options.ini",'openai',     # 0
                                    'fontsz1',   # 2
                                    'fontsz2',   # 3
                                    'role',      # 4
-                                   'log')       # 5
+                                   'log',       # 5
+                                   'stream',    # 6
+                                   'flush_ms',  # 7
+                                   'base_url',  # 8
+                                   'pool_max',  # 9
+                                   'pool_keepalive',   # 10
+                                   'connect_timeout',  # 11
+                                   'read_timeout',     # 12
+                                   'warmup',    # 13
+                                   'cache',     # 14
+                                   'cache_entries',    # 15
+                                   'cache_disk_mb',    # 16
+                                   'cache_ttl',        # 17
+                                   'history_page',     # 18
+                                   'batch_workers',    # 19
+                                   'batch_rpm',        # 20
+                                   'batch_tpm',        # 21
+                                   'models',           # 22
+                                   'workers',          # 23
+                                   'preload',          # 24
+                                   'metrics',          # 25
+                                   'conversation',     # 26
+                                   'conv_budget',      # 27
+                                   'retries',          # 28
+                                   'backoff_ms',       # 29
+                                   'backoff_max_ms',   # 30
+                                   'hedge',            # 31
+                                   'daemon',           # 32
+                                   'semantic',         # 33
+                                   'semantic_threshold',   # 34
+                                   'semantic_embedder',    # 35
+                                   'route',            # 36
+                                   'route_tiers',      # 37
+                                   'attach_inline_kb', # 38
+                                   defaults=DEFAULTS)
+aiclient.settings.update(base_url=opts[8], pool_max=opts[9], pool_keepalive=opts[10],
+                         connect_timeout=opts[11], read_timeout=opts[12])
+HEDGE_SAMPLES = 20   # requests of a model needed before its p95 is trusted
 intro = f'''
 Welcome to wxAI
 
@@ -25,44 +100,152 @@ OpenAI Key: {opts[0]}
 Model: {opts[1]}
 role: {opts[4]}
 log: {opts[5]}
+stream: {opts[6]}
+conversation: {opts[26]}
 '''
 
+def preload():
+    ''' background thread: import what the first submit and
+        export will need once the window is already on screen '''
+    for name in ("openai", "httpx", "markdown", "webbrowser"):
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    wx.CallAfter(startup.report)
+
+
+#----------------------------
+# SET CUSTOM FONTS
+# https://docs.wxpython.org/wx.FontInfo.html#wx-fontinfo
+# https://docs.wxpython.org/wx.FontFamily.enumeration.html#wx-fontfamily
+def set_fonts(text1, text2):
+    ''' fonts for a prompt / response pair from fontsz1 and fontsz2 '''
+    if platform.system() == "Windows":
+        custom_font1 = wx.Font( wx.FontInfo(int(opts[2])).Family(wx.FONTFAMILY_MODERN) )  # monospace
+        text1.SetFont(custom_font1)
+        font = wx.Font(
+            int(opts[3]),                # Font size
+            wx.FONTFAMILY_MODERN,   # Font family: MODERN is typically monospaced
+            wx.FONTSTYLE_NORMAL,    # Font style
+            wx.FONTWEIGHT_NORMAL,   # Font weight
+            False,                  # Underlined
+            "Consolas"              # Face name
+        )
+        # custom_font2 = wx.Font( wx.FontInfo(int(opts[3])).Family(wx.FONTFAMILY_MODERN) )
+        text2.SetFont(font)
+    else:
+        custom_font1 = wx.Font( wx.FontInfo(int(opts[2])).Family(wx.FONTFAMILY_MODERN) )  # monospace
+        text1.SetFont(custom_font1)
+        custom_font2 = wx.Font( wx.FontInfo(int(opts[3])).Family(wx.FONTFAMILY_TELETYPE) )
+        text2.SetFont(custom_font2)
+
+
+class Session(wx.Panel):
+    ''' one tab: its own prompt (text1), response (text2),
+        find state and request status '''
+
+    def __init__(self, book, frame, name):
+        super().__init__(book)
+        self.name = name
+        self.status = "idle"          # idle, queued, running, done, failed, cancelled
+        self.cancel = None            # retry.CancelToken of the request in progress (Esc)
+        self.stream_started = False   # first batch has replaced "Processing ..."
+        self.finder = findengine.FindEngine()
+        self.renderer = mdpreview.IncrementalRenderer()  # markdown -> HTML, per block
+        self.blocks = codeblocks.CodeBlockIndex()  # fenced code in text2, fed while streaming
+        self.blocks_stale = False     # text2 was changed other than by streaming
+        self.conversation = None      # conversation.Conversation in chat mode (Ctrl-K)
+        self.attachments = []         # paths of files sent with the prompt (Ctrl-Shift-A)
+        if opts[26].lower() == "on":
+            self.conversation = conversation.Conversation(opts[27])
+        self.frame = frame
+        vbox = wx.BoxSizer(wx.VERTICAL)
+
+        # Prompt area - expands horizontally but not vertically
+        self.text1 = wx.TextCtrl(self, style=wx.TE_MULTILINE)
+        self.text1.SetMinSize((-1, 125))  # Set minimum height
+        vbox.Add(self.text1, 0, wx.EXPAND)
+        self.text1.Bind(wx.EVT_KEY_DOWN, frame.on_key_down_hotkeys)
+        self.text1.SetToolTip("Enter Prompt in this field - drop files here to attach them")
+        self.text1.SetDropTarget(FileDrop(self))
+
+        # Attached files - hidden while there are none
+        self.files_label = wx.StaticText(self)
+        vbox.Add(self.files_label, 0, wx.EXPAND | wx.TOP, 2)
+        self.files_label.Hide()
+
+        # Response area - expands both ways
+        self.text2 = wx.TextCtrl(self, style=wx.TE_MULTILINE | wx.TE_RICH2)  # wx.TE_DONTWRAP
+        vbox.Add(self.text2, 1, wx.EXPAND | wx.TOP, 5)
+        self.text2.Bind(wx.EVT_KEY_DOWN, frame.on_key_down_hotkeys)
+        self.text2.Bind(wx.EVT_TEXT, self.on_text2_changed)
+
+        self.SetSizer(vbox)
+        set_fonts(self.text1, self.text2)
+
+    @property
+    def busy(self):
+        return self.status in ("queued", "running")
+
+    def attach(self, paths):
+        ''' add files to the prompt - a file is only listed once '''
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isfile(path) and path not in self.attachments:
+                self.attachments.append(path)
+        self.show_attachments()
+
+    def clear_attachments(self):
+        self.attachments = []
+        self.show_attachments()
+
+    def show_attachments(self):
+        names = ", ".join(os.path.basename(p) for p in self.attachments)
+        self.files_label.SetLabel(f"Attached: {names}" if names else "")
+        self.files_label.Show(bool(names))
+        self.Layout()
+
+    def on_text2_changed(self, event):
+        ''' response text changed - cached find matches are stale '''
+        self.finder.invalidate()
+        self.blocks_stale = True
+        self.frame.preview_changed(self)
+        event.Skip()
+
+
+@profiler.handlers("findNext", "doSearchDialog", "highlight_matches", "new_session",
+                   "close_session", "refresh_preview", "copy_block", "save_blocks",
+                   "request_worker", "gptCode")
 class MyFrame(wx.Frame):
     def __init__(self, parent, title="wxAI V1.1 OpenAI " + opts[1]):
         super(MyFrame, self).__init__(parent, title=title, size=(600, 550))
 
+        # open the API connection while the widgets are being built
+        if opts[13].lower() == "on" and not opts[32]:
+            aiclient.start_warm_up(opts[0])
+
         panel = wx.Panel(self)
         sizer = wx.GridBagSizer(5, 5)
 
         # ----------------------------
-        # First Text Widget (text1) the Prompt area
+        # Session tabs - each tab has its own prompt (text1)
+        # and response (text2), see the Session class
         # ----------------------------
-        # This TextCtrl will expand horizontally but not vertically
-        self.text1 = wx.TextCtrl(panel, style=wx.TE_MULTILINE)
+        self.book = wx.Notebook(panel)
         sizer.Add(
-            self.text1,
+            self.book,
             pos=(0, 0),          # Position at row 0, column 0
-            span=(1, 5),         # Span of 1 row and 2 columns
-            flag=wx.EXPAND       # Allow horizontal expansion
-        )
-        sizer.SetItemMinSize(self.text1, self.text1.GetSize().GetWidth(), 125)  # Set minimum height
-        self.text1.Bind(wx.EVT_KEY_DOWN, self.on_key_down_hotkeys)
-        self.text1.SetToolTip("Enter Prompt in this field")
-        self.text1.SetFocus()
-
-        # ----------------------------
-        # Second Text Widget (text2) the response area
-        # ----------------------------
-        # This TextCtrl will expand both horizontally and vertically
-        self.text2 = wx.TextCtrl(panel, style=wx.TE_MULTILINE)  # wx.TE_DONTWRAP
-        sizer.Add(
-            self.text2,
-            pos=(1, 0),          # Position at row 1, column 0
-            span=(1, 5),         # Span of 1 row and 2 columns
+            span=(1, 5),         # Span of 1 row and 5 columns
             flag=wx.EXPAND       # Allow both horizontal and vertical expansion
         )
-        self.text2.Bind(wx.EVT_KEY_DOWN, self.on_key_down_hotkeys)
+        self.sessions = 0    # sessions created, for tab names
+        self.preview = None  # PreviewFrame when open (Ctrl-P)
+        self.preview_timer = None
+        self.new_session()
         self.text2.SetValue(intro)
+        self.text1.SetFocus()
+        self.book.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.on_tab_changed)
 
         # ----------------------------
         # Clear Button
@@ -70,7 +253,7 @@ class MyFrame(wx.Frame):
         clear_btn = wx.Button(panel, label="Clear")
         sizer.Add(
             clear_btn,
-            pos=(2, 0),          # Position at row 2, column 0
+            pos=(1, 0),          # Position at row 1, column 0
             span=(1, 1),         # Span of 1 row and 1 column
             flag=wx.EXPAND | wx.ALL, # Align to bottom-right
             border=5  # behaves like a "margin"
@@ -85,7 +268,7 @@ class MyFrame(wx.Frame):
         export_btn = wx.Button(panel, label="Export")
         sizer.Add(
             export_btn,
-            pos=(2, 1),          # Position at row 2, column 0
+            pos=(1, 1),          # Position at row 1, column 1
             span=(1, 1),         # Span of 1 row and 1 column
             flag=wx.EXPAND | wx.ALL, # Align to bottom-right
             border=5  # behaves like a "margin"
@@ -100,7 +283,7 @@ class MyFrame(wx.Frame):
         view_btn = wx.Button(panel, label="View Log")
         sizer.Add(
             view_btn,
-            pos=(2, 2),          # Position at row 2, column 0
+            pos=(1, 2),          # Position at row 1, column 2
             span=(1, 1),         # Span of 1 row and 1 column
             flag=wx.EXPAND | wx.ALL, # Align to bottom-right
             border=5  # behaves like a "margin"
@@ -114,7 +297,7 @@ class MyFrame(wx.Frame):
         submit_btn = wx.Button(panel, label="Submit")
         sizer.Add(
             submit_btn,
-            pos=(2, 3),          # Position at row 2, column 0
+            pos=(1, 3),          # Position at row 1, column 3
             span=(1, 1),         # Span of 1 row and 1 column
             flag=wx.EXPAND | wx.ALL, # Align to bottom-right
             border=5  # behaves like a "margin"
@@ -128,7 +311,7 @@ class MyFrame(wx.Frame):
         close_btn = wx.Button(panel, label="Close")
         sizer.Add(
             close_btn,
-            pos=(2, 4),          # Position at row 2, column 0
+            pos=(1, 4),          # Position at row 1, column 4
             span=(1, 1),         # Span of 1 row and 1 column
             flag=wx.EXPAND | wx.ALL, # Align to bottom-right
             border=5  # behaves like a "margin"
@@ -146,9 +329,11 @@ class MyFrame(wx.Frame):
         sizer.AddGrowableCol(2, 1)    # Export button grows horizontally
         sizer.AddGrowableCol(3, 1)    #
         sizer.AddGrowableCol(4, 1)    #
-        sizer.AddGrowableRow(1, 1)    #
+        sizer.AddGrowableRow(0, 1)    # session tabs
 
         panel.SetSizer(sizer)
+        self.CreateStatusBar(2)
+        self.SetStatusWidths([-3, -2])
 
         #----------------------------
         # set window metrics from winfo file
@@ -162,43 +347,178 @@ class MyFrame(wx.Frame):
             self.SetPosition(position)
             self.SetSize(wx.Size(w, h))
 
-        #----------------------------
-        # SET CUSTOM FONTS
-        # https://docs.wxpython.org/wx.FontInfo.html#wx-fontinfo
-        # https://docs.wxpython.org/wx.FontFamily.enumeration.html#wx-fontfamily
-        if platform.system() == "Windows":
-            custom_font1 = wx.Font( wx.FontInfo(int(opts[2])).Family(wx.FONTFAMILY_MODERN) )  # monospace
-            self.text1.SetFont(custom_font1)
-            font = wx.Font(
-                int(opts[3]),                # Font size
-                wx.FONTFAMILY_MODERN,   # Font family: MODERN is typically monospaced
-                wx.FONTSTYLE_NORMAL,    # Font style
-                wx.FONTWEIGHT_NORMAL,   # Font weight
-                False,                  # Underlined
-                "Consolas"              # Face name
-            )
-            # custom_font2 = wx.Font( wx.FontInfo(int(opts[3])).Family(wx.FONTFAMILY_MODERN) )
-            self.text2.SetFont(font)
-        else:
-            custom_font1 = wx.Font( wx.FontInfo(int(opts[2])).Family(wx.FONTFAMILY_MODERN) )  # monospace
-            self.text1.SetFont(custom_font1)
-            custom_font2 = wx.Font( wx.FontInfo(int(opts[3])).Family(wx.FONTFAMILY_TELETYPE) )
-            self.text2.SetFont(custom_font2)
-
-
         # DISABLE View Log if not set to 'on'
         if opts[5] == "off":
             view_btn.Enable(False)
             view_btn.SetToolTip("Log is 'off'")
         else:
-            view_btn.SetToolTip("View past queries")
+            view_btn.SetToolTip("View past queries (press again for older ones)")
 
         # Variables to store search state
         self.search_text = ""
         self.search_pos = 0
+        self.find_opts = {'regex': False, 'whole': False, 'case': False}
+
+        # Per request telemetry (metrics.jsonl)
+        self.metrics = None
+        if opts[25].lower() == "on":
+            self.metrics = metrics.Metrics("metrics.jsonl")
+        self.stats_cache = {}   # metrics.stats() of the last week - see refresh_stats
+
+        # Model router (route=on) - picks a tier from route_tiers per prompt
+        self.router = None
+        if opts[36].lower() == "on":
+            import router
+            tiers = [m.strip() for m in opts[37].split(",") if m.strip()]
+            self.router = router.Router(tiers or [opts[1]])
 
+        # Shared worker pool for all tabs
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=int(opts[23]))
+
+        # Thin client of a running daemon (python3 wxAI.py --daemon),
+        # which then keeps the cache and the history for every tool
+        self.daemon = None
+        if opts[32]:
+            import daemon
+            self.daemon = daemon.Client(opts[32])
+
+        # Content hash -> file id of uploaded attachments (uploads.json)
+        self.uploads = attach.Uploads("uploads.json")
+
+        # Response cache (memory LRU + cache.db)
+        self.cache = None
+        if opts[14].lower() == "on" and not self.daemon:
+            self.cache = respcache.ResponseCache("cache.db", opts[15], opts[16], opts[17])
+
+        # Query history (history.db) - replaces appending to log.md
+        self.history = None
+        self.view_oldest = None  # id of the oldest exchange shown by View Log
+        if self.daemon:
+            self.history = daemon.RemoteHistory(self.daemon)
+        elif opts[5].lower() == "on":
+            self.history = history.open_history("history.db", "log.md")
+        if self.history:
+            self.history.on_error = lambda msg: wx.CallAfter(self.SetStatusText, f"History: {msg}")
+        self.semantic = None     # semcache.SemanticIndex once loaded (semantic=on)
+        self.semantic_lock = threading.Lock()   # one sync_semantic at a time
+        self.viewer_export = None   # temporary log.md export shown by Ctrl-O
+        self.Bind(wx.EVT_CLOSE, self.on_window_close)
+        panel.Bind(wx.EVT_PAINT, self.on_first_paint)
+
+        startup.mark("frame built")
         self.Show()
+        if '--profile' in sys.argv:
+            self.on_profile()
 
+    def on_first_paint(self, event):
+        ''' the window is on screen - now load the heavy modules '''
+        event.GetEventObject().Unbind(wx.EVT_PAINT)
+        event.Skip()
+        startup.mark("first paint")
+        if opts[24].lower() == "on":
+            threading.Thread(target=preload, name="preload", daemon=True).start()
+        else:
+            wx.CallAfter(startup.report)
+        if opts[33].lower() == "on" and self.history and not self.daemon:
+            threading.Thread(target=self.load_semantic, name="semantic", daemon=True).start()
+        threading.Thread(target=self.refresh_stats, name="stats", daemon=True).start()
+
+    def load_semantic(self):
+        ''' background thread: load semantic.npz and embed the prompts
+            logged since it was saved (all of them the first time) '''
+        try:
+            import semcache
+            if semcache.numpy is None:
+                wx.CallAfter(self.SetStatusText, "semantic=on needs numpy")
+                return
+            self.semantic = semcache.open_index(opts[35], opts[0], self.history)
+        except Exception as e:
+            wx.CallAfter(self.SetStatusText, f"Semantic cache not loaded: {e}")
+
+
+    # ----------------------------
+    #   Sessions (tabs)
+    # ----------------------------
+
+    @property
+    def session(self):
+        ''' the Session in the selected tab '''
+        return self.book.GetCurrentPage()
+
+    @property
+    def text1(self):
+        return self.session.text1
+
+    @property
+    def text2(self):
+        return self.session.text2
+
+    @property
+    def finder(self):
+        return self.session.finder
+
+    def new_session(self):
+        ''' add a tab and select it (Ctrl-T) '''
+        self.sessions += 1
+        session = Session(self.book, self, f"Tab {self.sessions}")
+        self.book.AddPage(session, session.name, select=True)
+        session.text1.SetFocus()
+
+    def close_session(self):
+        ''' close the selected tab (Ctrl-W) - the last one stays '''
+        if self.book.GetPageCount() > 1:
+            if self.session.busy:
+                self.session.cancel.cancel()
+            self.book.DeletePage(self.book.GetSelection())
+            self.text1.SetFocus()
+
+    def on_tab_changed(self, event):
+        self.search_pos = 0
+        self.view_oldest = None
+        if self.preview:
+            self.preview.show(self.session.renderer, self.text2.GetValue(), reset=True)
+        self.show_tab_status(self.session)
+        event.Skip()
+
+    def on_preview(self):
+        ''' open or close the live HTML preview (Ctrl-P) '''
+        if self.preview:
+            self.preview.Close()
+            return
+        global html2
+        if html2 is None:
+            try:
+                import wx.html2 as html2
+            except ImportError:
+                wx.MessageBox("wx.html2 (WebView) is not available", "Preview")
+                return
+        self.preview = PreviewFrame(self)
+        self.preview.show(self.session.renderer, self.text2.GetValue(), reset=True)
+
+    def preview_changed(self, session):
+        ''' text2 changed - refresh the preview at most every 200 ms '''
+        if self.preview and session is self.session and not self.preview_timer:
+            self.preview_timer = wx.CallLater(200, self.refresh_preview)
+
+    def refresh_preview(self):
+        self.preview_timer = None
+        if self.preview:
+            self.preview.show(self.session.renderer, self.text2.GetValue())
+
+    def set_status(self, session, status):
+        ''' idle, queued, running, done or failed - shown on the tab '''
+        session.status = status
+        i = self.book.FindPage(session)
+        if i != wx.NOT_FOUND:
+            label = session.name if status == "idle" else f"{session.name} [{status}]"
+            self.book.SetPageText(i, label)
+        if session is self.session:
+            self.show_tab_status(session)
+
+    def show_tab_status(self, session):
+        running = sum(1 for i in range(self.book.GetPageCount())
+                      if self.book.GetPage(i).busy)
+        self.SetStatusText(f"{session.name}: {session.status}   ({running} in progress)", 1)
 
     # ----------------------------
     #   Event handlers follow
@@ -215,6 +535,28 @@ class MyFrame(wx.Frame):
             fout.write(x + "|" + y + "|" + w + "|" + h)
         self.Close()
 
+    def on_window_close(self, event):
+        ''' cancel running requests (so their worker threads end now
+            rather than at the end of a stream or backoff) and write
+            out any queued history before the window goes '''
+        if profiler.enabled:
+            print("profile written to", profiler.stop(), file=sys.stderr)
+        for i in range(self.book.GetPageCount()):
+            session = self.book.GetPage(i)
+            if session.busy:
+                session.cancel.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.semantic:
+            self.semantic.save()
+        if self.history:
+            self.history.close()
+            self.history = None
+        if self.viewer_export:
+            try:
+                os.remove(self.viewer_export)
+            except OSError:
+                pass
+        event.Skip()
 
     def on_clear(self, event):
         ''' Event handler for the Clear button.'''
@@ -230,59 +572,362 @@ class MyFrame(wx.Frame):
         if result == wx.ID_YES:
             self.text1.SetValue("")
             self.text2.SetValue("")
+            self.session.clear_attachments()
+            self.view_oldest = None
+            if self.session.conversation:
+                self.session.conversation.reset()
 
 
     def on_export(self, event):
         ''' convert MD file to HTML file and open in default browser '''
-        mdtext = self.text2.GetValue()
-        htmlText = markdown.markdown(mdtext, extensions=['tables', 'fenced_code'])
+        htmlText = mdpreview.render(self.text2.GetValue())
         htmlFile = "exported.html"
         # open in default browser
         with open(htmlFile, 'w', encoding='utf-8') as file:
             file.write(htmlText)
+        import webbrowser
         webbrowser.open(htmlFile)
 
 
+    def on_export_site(self):
+        ''' Ctrl-Shift-E: the whole history as HTML pages in site/.
+            sitegen.py runs as its own process (it starts a process pool)
+            and only renders exchanges that are new or changed. '''
+        if not self.history:
+            wx.MessageBox("Log is 'off'", "Export history")
+            return
+        self.history.flush()   # include the last exchange
+        self.SetStatusText("Exporting the history to site/ ...")
+
+        def run():
+            import subprocess
+            here = os.path.dirname(os.path.abspath(__file__))
+            proc = subprocess.run([sys.executable, os.path.join(here, "sitegen.py"), "site"],
+                                  capture_output=True, text=True)
+            wx.CallAfter(self.on_site_exported, proc.returncode, (proc.stdout + proc.stderr).strip())
+        threading.Thread(target=run, name="sitegen", daemon=True).start()
+
+    def on_site_exported(self, code, output):
+        self.SetStatusText(output.splitlines()[-1] if output else "")
+        if code != 0:
+            wx.MessageBox(output, "Export history", wx.OK | wx.ICON_ERROR)
+            return
+        import webbrowser
+        webbrowser.open("file://" + os.path.abspath(os.path.join("site", "index.html")))
+
     def on_view(self, event):
-        ''' view the current log
-            if set to "on" in options '''
-        with open("log.md", "r", encoding='utf-8') as fin:
-            self.text2.SetValue(fin.read())
+        ''' view the most recent history_page exchanges.
+            Pressing again pages older ones in at the top. '''
+        try:
+            self.view_page()
+        except ConnectionError as e:   # the daemon is not running
+            wx.MessageBox(str(e), "History", wx.OK | wx.ICON_ERROR)
+
+    def view_page(self):
+        if self.view_oldest is None:
+            rows = self.history.recent(int(opts[18]))
+            self.text2.SetValue("".join(history.format_entry(r[1], r[3], r[4]) for r in rows))
+            self.text2.SetInsertionPointEnd()
+        else:
+            rows = self.history.recent(int(opts[18]), self.view_oldest)
+            if not rows:
+                self.SetStatusText("No older entries")
+                return
+            older = "".join(history.format_entry(r[1], r[3], r[4]) for r in rows)
+            self.text2.SetInsertionPoint(0)
+            self.text2.WriteText(older)
+            self.text2.ShowPosition(len(older))
+        if rows:
+            self.view_oldest = rows[0][0]
+        self.SetStatusText(f"History: showing back to entry {self.view_oldest} of {self.history.count()}")
         self.text2.SetFocus()
-        self.text2.SetInsertionPointEnd()
 
 
-    def on_submit(self, event):
-        ''' Event handler for Submit button (Ctrl-G). '''
-        self.text2.SetValue("Processing ...")
-        wx.Yield()
+    def on_submit(self, event, refresh=False, model=None, decision=None):
+        ''' Event handler for Submit button (Ctrl-G).
+            The request is queued on the worker pool for the selected tab.
+            refresh=True (Ctrl-Shift-G) skips the cache and replaces the entry.
+            model (Ctrl-Alt-G) overrides the routing decision.
+            Attached files are part of the cache key (by size and time)
+            and a similar prompt is not offered for them. '''
+        session = self.session
+        if session.busy:
+            self.SetStatusText(f"{session.name} already has a request in progress")
+            return
+        self.view_oldest = None
         query = self.text1.GetValue()
-        aitext = self.gptCode(opts[0], opts[1], query)
-        if aitext == "":
-            self.text2.SetValue("")
-            self.text1.SetValue("")
+        files = list(session.attachments)
+        if model is None:
+            model, decision = self.route(query)
+        if decision:
+            self.router.log(decision, model)
+            self.SetStatusText(f"{model}: {decision.reason}")
+        key = respcache.make_key(model, opts[4], query + "\0" + attach.signature(files))
+        if self.cache and not refresh and not session.conversation:
+            t0 = perf_counter()
+            aitext = self.cache.get(key)
+            if aitext is not None:
+                self.text2.SetValue(aitext)
+                ms = (perf_counter() - t0) * 1000
+                self.SetStatusText(f"Cached answer ({ms:.2f} ms) - Ctrl-Shift-G to refresh")
+                return
+        similar = bool(self.semantic) and not refresh and not session.conversation and not files
+        session.stream_started = False
+        session.text2.SetValue("Queued ...")
+        self.set_status(session, "queued")
+        session.cancel = retry.CancelToken()
+        self.pool.submit(self.request_worker, session, opts[0], model, query, key,
+                         opts[6].lower() == "on", perf_counter(), session.cancel, refresh, files,
+                         similar)
+
+    def route(self, query):
+        ''' (model, router.Decision) for query - "model" and None
+            unless route=on '''
+        if not self.router:
+            return opts[1], None
+        decision = self.router.choose(query, self.model_stats())
+        return decision.model, decision
+
+    def on_submit_choose(self, event):
+        ''' Ctrl-Alt-G: choose the model for this submit, with the
+            router's choice selected '''
+        query = self.text1.GetValue()
+        if not query.strip():
             return
-        self.text2.SetValue(aitext)
-        # append to log.md ?
-        if opts[5].lower() == "on":
-            today = strftime("%a %d %b %Y", localtime())
-            tm = strftime("%H:%M")
-            with open("log.md", "a", encoding='utf-8') as fout:
-                fout.write("\n\n=================================== " + today + " " + tm + "\n")
-                fout.write(query)
-                fout.write("\n=====================================\n\n")
-                fout.write(aitext)
-
-    def gptCode(self, key: str, model: str, query: str) -> str:
-        ''' method to access OpenAI chat.completions API '''
+        model, decision = self.route(query)
+        choices = list(self.router.tiers) if self.router else []
+        for m in [opts[1]] + opts[22].split(","):
+            if m.strip() and m.strip() not in choices:
+                choices.append(m.strip())
+        msg = f"Router: {model} - {decision.reason}" if decision else f"Default model: {model}"
+        dlg = wx.SingleChoiceDialog(self, msg, "Model for this prompt", choices)
+        dlg.SetSelection(choices.index(model))
+        if dlg.ShowModal() == wx.ID_OK:
+            self.on_submit(event, model=dlg.GetStringSelection(), decision=decision)
+        dlg.Destroy()
+
+    def offer_similar(self, session, query, token):
+        ''' worker thread: look up the closest past prompt and, if it
+            is similar enough, ask on the UI thread whether to reuse its
+            answer. True when the answer was reused (or the request
+            was cancelled meanwhile). The index is kept
+            up to date by sync_semantic; when the lookup fails
+            (embeddings API) the prompt is just sent. '''
+        t0 = perf_counter()
+        try:
+            hit = self.semantic.lookup(query)
+        except Exception as e:
+            wx.CallAfter(self.SetStatusText, f"Semantic lookup skipped: {e}")
+            return False
+        ms = (perf_counter() - t0) * 1000
+        if hit is None or hit[0] < float(opts[34]):
+            return False
+        row = self.history.get(hit[1])
+        if row is None:
+            return False
+        answer = []
+        done = threading.Event()
+        wx.CallAfter(self.ask_reuse, session, row, hit[0], ms, answer, done)
+        while not done.wait(0.2):
+            if token.cancelled:   # the window is closing
+                return True
+        return bool(answer and answer[0])
+
+    def ask_reuse(self, session, row, score, ms, answer, done):
+        ''' UI thread: the reuse dialog for offer_similar - the
+            worker waits on done for answer[0] '''
         try:
-            client = OpenAI(
-            api_key = os.environ.get(key)  # openai API
+            answer.append(session and not session.cancel.cancelled
+                          and self.reuse_dialog(session, row, score, ms))
+        finally:
+            done.set()
+
+    def reuse_dialog(self, session, row, score, ms):
+        prompt = row[3].strip()
+        if len(prompt) > 300:
+            prompt = prompt[:300] + " ..."
+        dlg = wx.MessageDialog(
+            self,
+            f"A similar prompt was answered on {strftime('%a %d %b %Y %H:%M', localtime(row[1]))} "
+            f"({score:.0%} alike, found in {ms:.1f} ms):\n\n{prompt}\n\nUse that answer?",
+            "Similar prompt",
+            wx.YES_NO | wx.YES_DEFAULT | wx.ICON_QUESTION
         )
+        dlg.SetYesNoLabels("Use answer", "Send anyway")
+        reuse = dlg.ShowModal() == wx.ID_YES
+        dlg.Destroy()
+        if reuse:
+            session.text2.SetValue(row[4])
+            self.set_status(session, "done")
+            self.SetStatusText(f"Answer of history entry {row[0]} ({score:.0%} alike) - "
+                               "Ctrl-Shift-G to send this prompt")
+        return reuse
+
+    def on_cancel(self):
+        ''' Esc: cancel the selected tab's request, queued or running.
+            Text streamed so far stays; nothing is cached or logged. '''
+        session = self.session
+        if not session.busy:
+            return False
+        session.cancel.cancel()
+        if not session.stream_started:
+            session.text2.SetValue("")
+        self.set_status(session, "cancelled")
+        self.SetStatusText(f"{session.name}: request cancelled")
+        return True
+
+    def write_log(self, query, aitext, model=None):
+        ''' queue the exchange for history.db if log is "on" '''
+        if self.history:
+            self.history.add(model or opts[1], query, aitext)
+            if self.semantic:
+                threading.Thread(target=self.sync_semantic, name="semantic", daemon=True).start()
+
+    def sync_semantic(self):
+        ''' background thread: embed the prompts logged since the last
+            sync, so a submit only has to embed its own prompt '''
+        with self.semantic_lock:
+            self.history.flush()
+            try:
+                self.semantic.sync(self.history)
+            except Exception as e:
+                wx.CallAfter(self.SetStatusText, f"Semantic cache not updated: {e}")
+
+    def request_worker(self, session, apikey, model, query, key, stream, queued, token,
+                       refresh=False, files=(), similar=False):
+        ''' worker thread - never touch widgets here, use wx.CallAfter.
+            With stream=True the answer is passed to the tab in batches.
+            queued is the perf_counter() of the submit, for the queue time.
+            token (retry.CancelToken) is cancelled by Esc.
+            files are the paths attached to the prompt.
+            similar: first offer the answer of a similar past prompt.
+            With a daemon, one-shot prompts go through it (refresh skips
+            its cache); it caches, logs and records them itself.
+            Prompts with files are sent directly. '''
+        if token.cancelled:
+            return  # cancelled while queued
+        if similar and self.offer_similar(session, query, token):
+            return  # the tab shows the reused answer
+        start = perf_counter()
+        wx.CallAfter(self.on_request_start, session, token)
+        buf = None
+        if stream:
+            buf = streaming.StreamBuffer(lambda chunk: wx.CallAfter(self.on_stream_chunk, session, chunk, token),
+                                         int(opts[7]) / 1000)
+        stats = {}
+        remote = self.daemon is not None and not session.conversation and not files
+        try:
+            if remote:
+                aitext = self.daemon.submit(query, model, refresh, buf.add if buf else None,
+                                            stats, token)
+            else:
+                aitext = self.gptCode(apikey, model, query, buf.add if buf else None, stats,
+                                      session.conversation, token, files)
+        except retry.Cancelled:
+            return  # the tab was updated by on_cancel
         except Exception as e:
-            wx.MessageBox(str(e), 'Info', wx.OK | wx.ICON_ERROR)
-            return ""
+            wx.CallAfter(self.on_request_error, session, str(e), token)
+            return
+        end = perf_counter()
+        if buf:
+            buf.flush()
+        if remote:
+            import daemon
+            wx.CallAfter(self.SetStatusText, daemon.describe(stats))
+            wx.CallAfter(self.on_request_done, session, query, key, model, aitext, token, remote)
+            return
+        rec = None
+        if self.metrics:
+            rec = self.metrics.add(model, (start - queued) * 1000, stats.get('connect', 0),
+                                   (stats.get('first', end) - start) * 1000,
+                                   (end - start) * 1000, stats.get('usage'))
+            self.refresh_stats()
+        wx.CallAfter(self.show_request_stats, rec, stats.get('saved', 0), stats.get('connect', 0),
+                     stats.get('retries', 0), stats.get('hedged', False))
+        wx.CallAfter(self.on_request_done, session, query + attach.note(files), key, model,
+                     aitext, token)
 
+    def show_request_stats(self, rec, saved, connect, retries=0, hedged=False):
+        ''' status bar: timings and tokens of the last request '''
+        if rec:
+            text = metrics.describe(rec) + f", saved {saved:.0f} ms"
+        elif connect > 0:
+            text = f"New connection {connect:.0f} ms, saved {saved:.0f} ms"
+        else:
+            text = f"Reused connection, saved ~{saved:.0f} ms"
+        if retries:
+            text += f", {retries} retries"
+        if hedged:
+            text += ", hedged"
+        self.SetStatusText(text)
+
+    def on_request_start(self, session, token):
+        if not session or token.cancelled:
+            return  # tab was closed or the request cancelled
+        self.set_status(session, "running")
+        session.text2.SetValue("Processing ...")
+
+    def on_stream_chunk(self, session, chunk, token):
+        ''' UI thread: add a batch of streamed text to the tab's text2 '''
+        if not session or token.cancelled:
+            return
+        if not session.stream_started:
+            session.stream_started = True
+            session.blocks.reset()
+            session.text2.SetValue(chunk)
+        else:
+            session.text2.AppendText(chunk)
+        session.blocks.feed(chunk)   # only the new text is parsed
+        session.blocks_stale = False
+
+    def on_request_done(self, session, query, key, model, aitext, token, remote=False):
+        ''' UI thread: answer complete - cache and log it, even if the tab is gone.
+            remote: the daemon answered and has already done both. '''
+        if token.cancelled:
+            return  # Esc came after the answer was in
+        if aitext and self.cache and not (session and session.conversation):
+            self.cache.put(key, aitext)
+        if aitext and not remote:
+            self.write_log(query, aitext, model)
+        if not session:
+            return
+        if not session.stream_started:
+            session.text2.SetValue(aitext)
+        self.set_status(session, "done")
+        if session.conversation:
+            session.text1.SetValue("")   # ready for the follow-up
+            session.clear_attachments()  # the thread on the server has them
+            self.SetStatusText(session.conversation.describe(), 1)
+
+    def on_request_error(self, session, msg, token):
+        if not session or token.cancelled:
+            return
+        session.text2.SetValue("")
+        self.set_status(session, "failed")
+        wx.MessageBox(msg, 'Info', wx.OK | wx.ICON_ERROR)
+
+    def gptCode(self, key: str, model: str, query: str, on_delta=None, stats=None,
+                conv=None, token=None, files=()) -> str:
+        ''' method to access OpenAI chat.completions API
+            runs on a worker thread and raises on errors.
+            on_delta(text) is called with streamed pieces when given.
+            stats (dict) receives 'id', 'usage', 'connect', 'saved',
+            'retries', 'hedged' and, when streamed, 'first'.
+            conv (Conversation) chains the request to the previous turn.
+            token (retry.CancelToken) cancels it - retry.Cancelled is raised.
+            files (paths) go with the prompt - small text files inline,
+            others uploaded unless uploads.json has their content hash. '''
+        if stats is None:
+            stats = {}
+        if token is None:
+            token = retry.CancelToken()
+        instructions = opts[4]  # role
+        previous_id = None
+        if conv:
+            if conv.over_budget():
+                conv.compact(lambda q, ins, prev: aiclient.ask(key, model, q, ins, prev), opts[4])
+            instructions = conv.instructions(opts[4])
+            previous_id = conv.previous_id
         # try:
         #     response = client.chat.completions.create(
         #       model=model,
@@ -297,16 +942,84 @@ class MyFrame(wx.Frame):
         #     return ""
 
         # Better OpenAI API for 'non-chat' related queries
+        shown = []  # set when the first streamed text went to the tab
+
+        def attempt(tok, claim):
+            ''' one copy of the request - hedging may run two '''
+            st = {}
+            if on_delta:
+                mine = []
+
+                def deliver(delta):
+                    if not mine:
+                        if not claim():
+                            raise retry.Cancelled("Lost the race")
+                        mine.append(True)
+                        shown.append(True)
+                    on_delta(delta)
+                aiclient.begin()
+                client = aiclient.get_client(key, max_retries=0)  # shared pool, our retries
+                text = streaming.stream_text(client, model, query, deliver, st,
+                                             instructions, previous_id, tok)
+            else:
+                response = aiclient.ask(key, model, query, instructions, previous_id, max_retries=0)
+                st['id'] = response.id
+                st['usage'] = response.usage
+                text = response.output_text
+            st['connect'] = aiclient.connect_ms()
+            st['saved'] = aiclient.saved_ms()
+            return text, st
+
+        def on_retry(n, wait, exc):
+            stats['retries'] = n
+            wx.CallAfter(self.SetStatusText, f"{model}: retry {n} in {wait:.1f} s - {exc}")
+
+        def on_hedge():
+            stats['hedged'] = True
+
+        if files:
+            wx.CallAfter(self.SetStatusText, f"Preparing {len(files)} attached files ...")
+            query = retry.with_retries(
+                lambda: attach.build_input(key, query, files, self.uploads,
+                                           int(opts[38]) * 1024), token,
+                int(opts[28]), int(opts[29]) / 1000, int(opts[30]) / 1000, on_retry=on_retry)
+            token.check()
+
+        delay = self.hedge_delay(model, bool(on_delta))
         try:
-            response = client.responses.create(
-                model=model,
-                input=query.strip()
-            )
-            output = response.output_text
-            return output
+            output, st = retry.with_retries(
+                lambda: retry.hedged(attempt, token, delay, on_hedge), token,
+                int(opts[28]), int(opts[29]) / 1000, int(opts[30]) / 1000,
+                can_retry=lambda: not shown, on_retry=on_retry)
         except Exception as e:
-            wx.MessageBox(str(e), 'Info', wx.OK | wx.ICON_ERROR)
-            return ""
+            if files:
+                self.uploads.forget_named(str(e))  # expired upload - send it again next time
+            raise
+        stats.update(st)
+        if conv:
+            conv.record(stats.get('id'), stats.get('usage'))
+        return output
+
+    def hedge_delay(self, model, stream):
+        ''' seconds after which a duplicate request is sent: the model's
+            p95 (of the first token when streamed), None when hedge is
+            off or the model has too few requests in metrics.jsonl '''
+        if opts[31].lower() != "on":
+            return None
+        s = self.model_stats().get(model)
+        if not s or s['n'] < HEDGE_SAMPLES:
+            return None
+        return max(s['ttft95'] if stream else s['p95'], 50) / 1000
+
+    def model_stats(self):
+        ''' metrics.stats() of the last week as last read by refresh_stats '''
+        return self.stats_cache
+
+    def refresh_stats(self):
+        ''' background or worker thread: read metrics.jsonl again for
+            the router and hedging - after startup and each request '''
+        if self.metrics and (self.router or opts[31].lower() == "on"):
+            self.stats_cache = self.metrics.stats(time() - 7 * 86400)
 
 
     def on_key_down_hotkeys(self, event):
@@ -314,14 +1027,47 @@ class MyFrame(wx.Frame):
         keycode = event.GetKeyCode()
         modifiers = event.GetModifiers()
 
-        if modifiers == (wx.MOD_CONTROL | wx.MOD_ALT) and keycode == ord('C'):  # Ctrl-Alt C on copy code
+        if modifiers == wx.MOD_NONE and keycode == wx.WXK_ESCAPE:  # cancel the request
+            if not self.on_cancel():
+                event.Skip()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_ALT) and keycode == ord('C'):  # Ctrl-Alt C on copy code
             self.on_copy_code()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_ALT) and ord('1') <= keycode <= ord('9'):
+            self.copy_block(keycode - ord('1'))  # copy the Nth code block
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_SHIFT) and keycode == ord('A'):  # attach files
+            self.on_attach()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_SHIFT) and keycode == ord('E'):  # history as a web site
+            self.on_export_site()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_SHIFT) and keycode == ord('F'):  # search history
+            self.on_history_search()
         elif modifiers == wx.MOD_CONTROL and keycode == ord('F'):  # Ctrl+F: open search dialog.
             self.doSearchDialog()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_SHIFT) and keycode == ord('N'):  # find previous
+            self.findNext(backward=True)
         elif modifiers == wx.MOD_CONTROL and keycode == ord('N'):  # Ctrl+N: find next occurrence.
             self.findNext()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_ALT) and keycode == ord('G'):
+            self.on_submit_choose(event)  # choose the model for this prompt
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_SHIFT) and keycode == ord('G'):
+            self.on_submit(event, refresh=True)  # bypass and refresh the cache
         elif modifiers == wx.MOD_CONTROL and keycode == ord('G'):
             self.on_submit(event)
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('I'):  # request statistics
+            self.on_stats()
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('K'):  # conversation mode
+            self.on_conversation_toggle()
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('M'):  # compare models
+            self.on_fanout()
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('O'):  # open a large file
+            self.on_open_viewer()
+        elif modifiers == (wx.MOD_CONTROL | wx.MOD_SHIFT) and keycode == ord('P'):  # profiling
+            self.on_profile()
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('P'):  # live preview
+            self.on_preview()
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('T'):  # new tab
+            self.new_session()
+        elif modifiers == wx.MOD_CONTROL and keycode == ord('W'):  # close tab
+            self.close_session()
         elif modifiers == wx.MOD_CONTROL and keycode == ord('Q'):
             self.on_close(event)
         elif modifiers == wx.MOD_CONTROL and keycode == ord('H'):  # Ctrl+F: open search dialog.
@@ -331,64 +1077,118 @@ class MyFrame(wx.Frame):
 
 
     def doSearchDialog(self):
-        # Open a dialog to accept search text.
-        dlg = wx.TextEntryDialog(self, "Enter text to search:", "Find")
+        # Open a dialog to accept search text and options.
+        dlg = FindDialog(self, self.search_text, self.find_opts)
         if dlg.ShowModal() == wx.ID_OK:
-            self.search_text = dlg.GetValue()
+            self.search_text, self.find_opts = dlg.get_values()
             # Start search from current insertion point.
             self.search_pos = self.text2.GetInsertionPoint()
             self.findNext()
         dlg.Destroy()
 
-    def findNext(self):
+    def findNext(self, backward=False):
         if not self.search_text:
             return  # Nothing to search.
 
-        # Get the full text from the TextCtrl.
-        full_text = self.text2.GetValue()
-        # For a case–insensitive search, convert both full text and search string to lower case.
-        lower_text = full_text.lower()
-        lower_search = self.search_text.lower()
+        # Matches are only recomputed when text2 or the search changed.
+        try:
+            fresh = self.finder.update(self.text2.GetValue, self.search_text, **self.find_opts)
+        except re.error as e:
+            wx.MessageBox(f"Bad regular expression: {e}", "Find", wx.OK | wx.ICON_ERROR)
+            return
+        if fresh:
+            self.highlight_matches()
 
-        # Search from the current position.
-        idx = lower_text.find(lower_search, self.search_pos)
-        if idx == -1:
-            # Optionally, notify the user if the search text is not found:
+        if backward:
+            hit = self.finder.previous(self.search_pos)
+        else:
+            hit = self.finder.next(self.search_pos)
+        if hit is None:
             wx.MessageBox(f'"{self.search_text}" was not found.', "Find", wx.OK | wx.ICON_INFORMATION)
             # Reset search position for a new search.
             self.search_pos = 0
-        else:
-            # Set focus to the TextCtrl and highlight the found text.
-            self.text2.SetFocus()
-            self.text2.ShowPosition(idx)
-            self.text2.SetSelection(idx, idx + len(self.search_text))
-            # Update the search position for next search.
-            self.search_pos = idx + len(self.search_text)
+            self.SetStatusText("")
+            return
+        i, start, end = hit
+        # Set focus to the TextCtrl and highlight the found text.
+        self.text2.SetFocus()
+        self.text2.ShowPosition(start)
+        self.text2.SetSelection(start, end)
+        # next search continues after this match, previous before it
+        self.search_pos = start if backward else end
+        self.SetStatusText(f'"{self.search_text}"  {i + 1} of {self.finder.count()}')
+
+    def highlight_matches(self, limit=5000):
+        ''' mark every match (up to limit) with a background colour '''
+        plain = wx.TextAttr(wx.NullColour, self.text2.GetBackgroundColour())
+        mark = wx.TextAttr(wx.NullColour, wx.Colour(255, 240, 120))
+        self.text2.Freeze()
+        self.text2.SetStyle(0, self.text2.GetLastPosition(), plain)
+        for n, (start, end) in enumerate(self.finder.matches()):
+            if n == limit:
+                break
+            self.text2.SetStyle(start, end, mark)
+        self.text2.Thaw()
+
+    def code_blocks(self):
+        ''' code block index of the selected tab, rebuilt only if
+            text2 changed since it was last parsed '''
+        session = self.session
+        if session.blocks_stale:
+            session.blocks.reset()
+            session.blocks.feed(self.text2.GetValue())
+            session.blocks_stale = False
+        return session.blocks.all_blocks()
 
     def on_copy_code(self):
-        text = self.text2.GetValue()
-        lines = text.splitlines()
-        result = []
-        in_backticks = False
-
-        for line in lines:
-            if line.startswith('```'):
-                if in_backticks:
-                    break
-                else:
-                    in_backticks = True
-                    continue
-            else:
-                if in_backticks:
-                    result.append(line)  # Collect lines within the back-ticked region
-
-        # Join selected text and put it to the clipboard
-        if result:
-            clipboard_text = '\n'.join(result)
-            self.set_clipboard(clipboard_text)
-            wx.MessageBox('Copied to clipboard', "Code")
-        else:
+        ''' copy the code block - or pick one from a menu if there are several '''
+        blocks = self.code_blocks()
+        if not blocks:
             wx.MessageBox('No text found between triple back-ticks.')
+            return
+        if len(blocks) == 1:
+            self.copy_block(0)
+            return
+        menu = wx.Menu()
+        for n, block in enumerate(blocks):
+            lines = block.code.count("\n") + 1
+            label = f"{n + 1}  {block.lang or 'code'}  ({lines} lines)"
+            item = menu.Append(wx.ID_ANY, label)
+            self.Bind(wx.EVT_MENU, lambda e, n=n: self.copy_block(n), item)
+        menu.AppendSeparator()
+        item = menu.Append(wx.ID_ANY, "Copy all")
+        self.Bind(wx.EVT_MENU, lambda e: self.copy_all_blocks(), item)
+        item = menu.Append(wx.ID_ANY, "Save all to files ...")
+        self.Bind(wx.EVT_MENU, lambda e: self.save_blocks(), item)
+        self.PopupMenu(menu)
+        menu.Destroy()
+
+    def copy_block(self, n):
+        ''' copy code block n (0 based) of the selected tab '''
+        blocks = self.code_blocks()
+        if n >= len(blocks):
+            self.SetStatusText(f"There is no code block {n + 1}")
+            return
+        self.set_clipboard(blocks[n].code)
+        self.SetStatusText(f"Code block {n + 1} copied to clipboard")
+
+    def copy_all_blocks(self):
+        blocks = self.code_blocks()
+        self.set_clipboard("\n\n".join(b.code for b in blocks))
+        self.SetStatusText(f"{len(blocks)} code blocks copied to clipboard")
+
+    def save_blocks(self):
+        ''' write each code block to its own file in a chosen folder '''
+        blocks = self.code_blocks()
+        with wx.DirDialog(self, "Save code blocks to", os.getcwd()) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            folder = dlg.GetPath()
+        for n, block in enumerate(blocks):
+            path = os.path.join(folder, f"block_{n + 1:02d}.{block.extension()}")
+            with open(path, "w", encoding='utf-8') as fout:
+                fout.write(block.code + "\n")
+        self.SetStatusText(f"{len(blocks)} code blocks saved in {folder}")
 
     def set_clipboard(self, text):
         if wx.TheClipboard.Open():
@@ -396,20 +1196,465 @@ class MyFrame(wx.Frame):
             wx.TheClipboard.Close()
 
 
+    def on_attach(self):
+        ''' Ctrl-Shift-A: pick files to send with the prompt
+            (or drop them on the prompt area) '''
+        with wx.FileDialog(self, "Attach files", wildcard="All files|*",
+                           style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST | wx.FD_MULTIPLE) as dlg:
+            if dlg.ShowModal() == wx.ID_OK:
+                self.session.attach(dlg.GetPaths())
+                self.SetStatusText(f"{len(self.session.attachments)} files attached - Clear removes them")
+
+
+    def on_profile(self):
+        ''' Ctrl-Shift-P: start profiling, or stop it and write the report '''
+        if not profiler.enabled:
+            profiler.start()
+            self.SetStatusText("Profiling - Ctrl-Shift-P again writes the report")
+            return
+        path = profiler.stop()
+        self.SetStatusText(f"Profile written to {path}")
+
+
+    def on_history_search(self):
+        ''' full-text search of all past prompts and responses '''
+        if not self.history:
+            wx.MessageBox("Log is 'off'", "History")
+            return
+        dlg = HistorySearchDialog(self, self.history)
+        row = None
+        try:
+            if dlg.ShowModal() == wx.ID_OK and dlg.selected is not None:
+                row = self.history.get(dlg.selected)  # only this exchange is loaded
+        except ConnectionError as e:   # the daemon is not running
+            wx.MessageBox(str(e), "History", wx.OK | wx.ICON_ERROR)
+        if row:
+            self.view_oldest = None
+            self.text1.SetValue(row[3])
+            self.text2.SetValue(row[4])
+            self.SetStatusText(f"History entry {row[0]}  {strftime('%a %d %b %Y %H:%M', localtime(row[1]))}  {row[2]}")
+        dlg.Destroy()
+
+    def on_conversation_toggle(self):
+        ''' switch the selected tab between one-shot and conversation mode '''
+        session = self.session
+        if session.busy:
+            return
+        if session.conversation:
+            session.conversation = None
+            self.SetStatusText(f"{session.name}: one-shot prompts")
+        else:
+            session.conversation = conversation.Conversation(opts[27])
+            self.SetStatusText(f"{session.name}: conversation - follow-ups continue the thread, "
+                               "Clear starts a new one")
+
+    def on_open_viewer(self):
+        ''' show the whole history, or a (large) file, in the
+            memory-mapped viewer instead of text2 '''
+        if isinstance(self.history, history.History):
+            dlg = wx.MessageDialog(self, "Open the whole history or a file?", "Viewer",
+                                   wx.YES_NO | wx.CANCEL | wx.YES_DEFAULT | wx.ICON_QUESTION)
+            dlg.SetYesNoLabels("Whole history", "File ...")
+            choice = dlg.ShowModal()
+            dlg.Destroy()
+            if choice == wx.ID_YES:
+                self.view_whole_history()
+                return
+            if choice != wx.ID_NO:
+                return
+        with wx.FileDialog(self, "Open file", wildcard="Markdown (*.md)|*.md|All files|*",
+                           style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as dlg:
+            if dlg.ShowModal() == wx.ID_OK:
+                BigViewer(self, dlg.GetPath())
+
+    def view_whole_history(self):
+        ''' export history.db in the log.md format to a temporary file
+            on a thread, then open that in the viewer '''
+        import tempfile
+        path = os.path.join(tempfile.gettempdir(), f"wxai-history-{os.getpid()}.md")
+        self.viewer_export = path
+        self.SetStatusText("Exporting the history for the viewer ...")
+
+        def run():
+            try:
+                self.history.flush()   # include the last exchange
+                self.history.export_markdown(path)
+            except Exception as e:
+                wx.CallAfter(wx.MessageBox, str(e), "Viewer", wx.OK | wx.ICON_ERROR)
+                return
+            wx.CallAfter(self.SetStatusText, "")
+            wx.CallAfter(BigViewer, self, path)
+        threading.Thread(target=run, name="history export", daemon=True).start()
+
+    def on_stats(self):
+        ''' latency / throughput per model from metrics.jsonl '''
+        if not self.metrics:
+            wx.MessageBox("metrics is 'off'", "Statistics")
+            return
+        dlg = StatsDialog(self, self.metrics)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+    def on_fanout(self):
+        ''' send the prompt to every model in "models" at once '''
+        query = self.text1.GetValue()
+        if not query.strip():
+            return
+        models = [m.strip() for m in opts[22].split(",") if m.strip()]
+        FanoutFrame(self, query, models)
+
     def on_help_dialog(self):
         msg = '''
         Ctrl-H     This help message\n
         Ctrl-F     Find text\n
         Ctrl-N     Find next\n
+        Ctrl-Shift-N
+                   Find previous\n
+        Ctrl-Shift-F
+                   Search history\n
+        Ctrl-Shift-E
+                   Export history as HTML site\n
+        Ctrl-Shift-A
+                   Attach files to the prompt\n
+        Ctrl-I     Request statistics\n
+        Ctrl-K     Conversation on/off\n
+        Ctrl-M     Compare models\n
+        Ctrl-O     Open history or file in viewer\n
+        Ctrl-P     HTML preview\n
+        Ctrl-Shift-P
+                   Profiling on/off (report on off)\n
+        Ctrl-T     New tab\n
+        Ctrl-W     Close tab\n
         Ctrl-Q     Quit App\n
         Ctrl-G     Execute AI request\n
+        Ctrl-Shift-G
+                   Execute, bypass cache\n
+        Alt-Ctrl-G
+                   Execute with a chosen model\n
+        Esc        Cancel the request\n
         Alt-Ctrl-C
                    Copy Code in Markup\n
+                   (menu when there are several blocks)\n
+        Alt-Ctrl-1..9
+                   Copy code block 1..9\n
         '''
         #wx.MessageBox(msg)
         wx.MessageBox(msg, 'Hot Keys' , wx.OK)
 
 
+class FileDrop(wx.FileDropTarget):
+    ''' files dropped on a prompt are attached to it '''
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def OnDropFiles(self, x, y, filenames):
+        self.session.attach(filenames)
+        return True
+
+
+class FanoutFrame(wx.Frame):
+    ''' one prompt sent to several models concurrently,
+        each answer in its own tab as soon as it arrives '''
+
+    def __init__(self, parent, query, models):
+        super().__init__(parent, title="Compare: " + ", ".join(models), size=(700, 550))
+        self.parent = parent
+        self.query = query
+        self.models = models
+        self.pending = len(models)
+        self.t0 = perf_counter()
+
+        panel = wx.Panel(self)
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        self.book = wx.Notebook(panel)
+        self.pages = []
+        for model in models:
+            page = wx.TextCtrl(self.book, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_RICH2)
+            page.SetFont(parent.text2.GetFont())
+            page.SetValue("Processing ...")
+            self.book.AddPage(page, model + " ...")
+            self.pages.append(page)
+        vbox.Add(self.book, 1, wx.EXPAND | wx.ALL, 5)
+        panel.SetSizer(vbox)
+        self.CreateStatusBar()
+        self.SetStatusText(f"Waiting for {self.pending} models")
+        self.Show()
+
+        for i, model in enumerate(models):
+            threading.Thread(target=self.worker, args=(i, model), daemon=True).start()
+
+    def worker(self, i, model):
+        t0 = perf_counter()
+        try:
+            response = aiclient.ask(opts[0], model, self.query, opts[4])
+            usage = response.usage
+            if self.parent.metrics:
+                ms = (perf_counter() - t0) * 1000
+                self.parent.metrics.add(model, 0, aiclient.connect_ms(), ms, ms, usage)
+            wx.CallAfter(self.on_result, i, response.output_text, perf_counter() - t0,
+                         usage.input_tokens if usage else 0,
+                         usage.output_tokens if usage else 0)
+        except Exception as e:
+            wx.CallAfter(self.on_result, i, "", perf_counter() - t0, 0, 0, str(e))
+
+    def on_result(self, i, text, secs, tokens_in, tokens_out, error=None):
+        if not self:
+            return  # window was closed while waiting
+        model = self.models[i]
+        if error:
+            self.pages[i].SetValue(f"FAILED after {secs:.2f} s\n\n{error}")
+            self.book.SetPageText(i, model + " failed")
+        else:
+            rate = tokens_out / secs if secs else 0
+            self.pages[i].SetValue(f"{model}  |  {secs:.2f} s  |  {tokens_in} in, "
+                                   f"{tokens_out} out tokens  |  {rate:.0f} tok/s\n\n{text}")
+            self.book.SetPageText(i, f"{model} {secs:.1f}s")
+            self.parent.write_log(self.query, text, model)
+        self.pending -= 1
+        if self.pending:
+            self.SetStatusText(f"Waiting for {self.pending} models")
+        else:
+            self.SetStatusText(f"All {len(self.models)} answers in {perf_counter() - self.t0:.2f} s")
+
+
+class PreviewFrame(wx.Frame):
+    ''' live HTML view of the selected tab's response.
+        Only blocks that changed are sent to the page (setBlocks in
+        mdpreview.PAGE), so streamed answers do not reload the page. '''
+
+    def __init__(self, parent):
+        super().__init__(parent, title="wxAI Preview", size=(650, 600))
+        self.parent = parent
+        self.ready = False       # page script loaded
+        self.renderer = None     # renderer currently shown
+        self.sent = []           # keys of the blocks on the page
+        self.web = html2.WebView.New(self)
+        self.web.Bind(html2.EVT_WEBVIEW_LOADED, self.on_loaded)
+        self.web.SetPage(mdpreview.PAGE, "")
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+        self.Show()
+
+    def on_loaded(self, event):
+        self.ready = True
+        self.show(self.parent.session.renderer, self.parent.text2.GetValue(), reset=True)
+
+    def show(self, renderer, text, reset=False):
+        ''' render text, send the changed blocks to the page.
+            reset=True redraws everything (another tab was selected).
+            What changed is worked out against the blocks this page
+            has, not from update(), which others may call too. '''
+        if renderer is not self.renderer:
+            reset = True
+            self.renderer = renderer
+        renderer.update(text)
+        if reset or not self.ready:
+            self.sent = []
+        keys = renderer.keys
+        first = 0
+        while first < len(self.sent) and first < len(keys) and self.sent[first] == keys[first]:
+            first += 1
+        if first == len(keys) == len(self.sent):
+            return   # the page is up to date
+        if self.ready:
+            self.web.RunScript(f"setBlocks({first}, {json.dumps(renderer.htmls[first:])});")
+            self.sent = list(keys)
+
+    def on_close(self, event):
+        self.parent.preview = None
+        event.Skip()
+
+
+class StatsDialog(wx.Dialog):
+    ''' p50/p95/p99 latency and tokens per second per model '''
+
+    WINDOWS = [("Last hour", 3600), ("Last 24 hours", 86400),
+               ("Last 7 days", 7 * 86400), ("All", 0)]
+
+    def __init__(self, parent, mets):
+        super().__init__(parent, title="Request Statistics", size=(640, 320),
+                         style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.mets = mets
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        self.window = wx.Choice(self, choices=[w[0] for w in self.WINDOWS])
+        self.window.SetSelection(1)
+        self.window.Bind(wx.EVT_CHOICE, self.on_window)
+        vbox.Add(self.window, 0, wx.ALL, 5)
+        self.table = wx.ListCtrl(self, style=wx.LC_REPORT)
+        for i, (name, width) in enumerate((("Model", 150), ("Requests", 70), ("p50 s", 65),
+                                           ("p95 s", 65), ("p99 s", 65),
+                                           ("1st token s", 85), ("tok/s", 65))):
+            self.table.InsertColumn(i, name, width=width)
+        vbox.Add(self.table, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+        vbox.Add(self.CreateButtonSizer(wx.OK), 0, wx.EXPAND | wx.ALL, 5)
+        self.SetSizer(vbox)
+        self.on_window(None)
+
+    def on_window(self, event):
+        secs = self.WINDOWS[self.window.GetSelection()][1]
+        since = time() - secs if secs else 0
+        self.table.DeleteAllItems()
+        for model, st in sorted(self.mets.stats(since).items()):
+            i = self.table.InsertItem(self.table.GetItemCount(), model)
+            self.table.SetItem(i, 1, str(st['n']))
+            for col, name in ((2, 'p50'), (3, 'p95'), (4, 'p99'), (5, 'ttft50')):
+                self.table.SetItem(i, col, f"{st[name] / 1000:.2f}")
+            self.table.SetItem(i, 6, f"{st['tps']:.0f}")
+
+
+class BigViewer(wx.Frame):
+    ''' virtual list over a memory-mapped file: only the rows on
+        screen are read and drawn, whatever the size of the file '''
+
+    def __init__(self, parent, path):
+        super().__init__(parent, title=os.path.basename(path), size=(800, 600))
+        import bigview   # pulls in numpy - only when a file is opened (Ctrl-O)
+        self.index = bigview.LineIndex(path)
+        self.search_text = ""
+        self.list = BigList(self, self.index)
+        self.list.SetFont(parent.text2.GetFont())
+        self.list.Bind(wx.EVT_KEY_DOWN, self.on_key)
+        self.CreateStatusBar()
+        self.Bind(wx.EVT_CLOSE, self.on_close)
+        threading.Thread(target=self.index.build, daemon=True).start()
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_timer, self.timer)
+        self.timer.Start(200)
+        self.Show()
+
+    def on_timer(self, event):
+        ''' show the lines indexed so far '''
+        self.list.SetItemCount(self.index.count())
+        if self.index.done:
+            self.timer.Stop()
+            self.SetStatusText(f"{self.index.count():,} lines, {self.index.size / 1048576:.1f} MB")
+        else:
+            self.SetStatusText(f"indexing {self.index.progress():.0%} ...")
+
+    def on_key(self, event):
+        ''' Ctrl-F find, Ctrl-N find next (case sensitive) '''
+        keycode = event.GetKeyCode()
+        if event.GetModifiers() == wx.MOD_CONTROL and keycode == ord('F'):
+            dlg = wx.TextEntryDialog(self, "Enter text to search:", "Find", self.search_text)
+            if dlg.ShowModal() == wx.ID_OK:
+                self.search_text = dlg.GetValue()
+                self.find_next()
+            dlg.Destroy()
+        elif event.GetModifiers() == wx.MOD_CONTROL and keycode == ord('N'):
+            self.find_next()
+        else:
+            event.Skip()
+
+    def find_next(self):
+        if not self.search_text:
+            return
+        start = self.list.GetFirstSelected() + 1
+        i = self.index.find(self.search_text, start)
+        if i == -1:
+            self.SetStatusText(f'"{self.search_text}" was not found')
+            return
+        self.list.Select(i)
+        self.list.Focus(i)
+        self.list.EnsureVisible(i)
+
+    def on_close(self, event):
+        self.timer.Stop()
+        self.index.close()
+        event.Skip()
+
+
+class BigList(wx.ListCtrl):
+    ''' one column virtual ListCtrl, rows come from a LineIndex '''
+
+    def __init__(self, parent, index):
+        super().__init__(parent, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_NO_HEADER | wx.LC_SINGLE_SEL)
+        self.index = index
+        self.InsertColumn(0, "", width=4000)
+        self.SetItemCount(0)
+
+    def OnGetItemText(self, item, column):
+        return self.index.line(item).expandtabs(4)
+
+
+class FindDialog(wx.Dialog):
+    ''' search text plus regex / whole word / match case options '''
+
+    def __init__(self, parent, text, opts):
+        super().__init__(parent, title="Find")
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        vbox.Add(wx.StaticText(self, label="Enter text to search:"), 0, wx.ALL, 5)
+        self.text = wx.TextCtrl(self, value=text, size=(300, -1))
+        vbox.Add(self.text, 0, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+        self.regex = wx.CheckBox(self, label="Regular expression")
+        self.whole = wx.CheckBox(self, label="Whole word")
+        self.case = wx.CheckBox(self, label="Match case")
+        for box, name in ((self.regex, 'regex'), (self.whole, 'whole'), (self.case, 'case')):
+            box.SetValue(opts[name])
+            vbox.Add(box, 0, wx.LEFT | wx.TOP, 5)
+        vbox.Add(self.CreateButtonSizer(wx.OK | wx.CANCEL), 0, wx.EXPAND | wx.ALL, 5)
+        self.SetSizerAndFit(vbox)
+        self.text.SetFocus()
+        self.text.SelectAll()
+
+    def get_values(self):
+        return self.text.GetValue(), {'regex': self.regex.GetValue(),
+                                      'whole': self.whole.GetValue(),
+                                      'case': self.case.GetValue()}
+
+
+class HistorySearchDialog(wx.Dialog):
+    ''' search box and ranked list of matching history entries.
+        After ShowModal() == wx.ID_OK, "selected" holds the entry id. '''
+
+    def __init__(self, parent, hist):
+        super().__init__(parent, title="Search History", size=(700, 450),
+                         style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.hist = hist
+        self.ids = []
+        self.selected = None
+
+        vbox = wx.BoxSizer(wx.VERTICAL)
+        self.query = wx.TextCtrl(self, style=wx.TE_PROCESS_ENTER)
+        self.query.SetToolTip("All words must match, word* matches a prefix. Enter to search")
+        self.query.Bind(wx.EVT_TEXT_ENTER, self.on_search)
+        vbox.Add(self.query, 0, wx.EXPAND | wx.ALL, 5)
+
+        self.results = wx.ListCtrl(self, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        self.results.InsertColumn(0, "Date", width=130)
+        self.results.InsertColumn(1, "Model", width=100)
+        self.results.InsertColumn(2, "Match", width=440)
+        self.results.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_pick)
+        vbox.Add(self.results, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 5)
+
+        self.status = wx.StaticText(self, label="Double-click a result to load it")
+        vbox.Add(self.status, 0, wx.EXPAND | wx.ALL, 5)
+        self.SetSizer(vbox)
+        self.query.SetFocus()
+
+    def on_search(self, event):
+        t0 = perf_counter()
+        try:
+            rows = self.hist.search(self.query.GetValue())
+        except ConnectionError as e:   # the daemon is not running
+            self.status.SetLabel(str(e))
+            return
+        ms = (perf_counter() - t0) * 1000
+        self.results.DeleteAllItems()
+        self.ids = []
+        for id, ts, model, snippet in rows:
+            i = self.results.InsertItem(self.results.GetItemCount(),
+                                        strftime("%d %b %Y %H:%M", localtime(ts)))
+            self.results.SetItem(i, 1, model)
+            self.results.SetItem(i, 2, " ".join(snippet.split()))
+            self.ids.append(id)
+        self.status.SetLabel(f"{len(rows)} hits in {ms:.1f} ms")
+
+    def on_pick(self, event):
+        self.selected = self.ids[event.GetIndex()]
+        self.EndModal(wx.ID_OK)
+
+
 class MyApp(wx.App):
     def OnInit(self):
         frame = MyFrame(None)
@@ -417,5 +1662,11 @@ class MyApp(wx.App):
         return True
 
 if __name__ == '__main__':
+    if '--batch' in sys.argv:
+        import batch
+        sys.exit(batch.main(sys.argv[1:], opts))
+    if '--daemon' in sys.argv:
+        import daemon
+        sys.exit(daemon.main(sys.argv[1:], opts))
     app = MyApp(False)
     app.MainLoop()